@@ -1,27 +1,288 @@
 import openai
+import httpx
 import os
+import json
+import contextvars
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 from tabpy.tabpy_tools.client import Client
+from response_cache import ResponseCache, make_key
+from chunked import deadline, run_chunked, TIME_BUDGET
+import metrics
+
+# tiktoken gives exact token counts for batching, fall back to a rough estimate
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
 
 client = Client('http://localhost:9004/')
 
+MODEL = "gpt-4.1"
+TEMPERATURE = 0.0
+MAX_TOKENS = 150
+
+SYSTEM_MESSAGES = [
+    {"role": "system", "content": "You are TableauAI a powerful AI trained in Tableau calculations."},
+    {"role": "system", "content": "Only perform what is asked of you.  Do NOT provide explanations or suggestions. Never use punctuations"},
+    {"role": "system", "content": "Ensure groups, labels and other naming conventions you use are identical."},
+]
+
+# One pooled client per process: keep-alive connections are reused across calls
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('TABGPT_OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_TIMEOUT = float(os.environ.get('TABGPT_OPENAI_TIMEOUT', 60))
+# 429 and 5xx responses are retried with exponential backoff, honouring Retry-After
+OPENAI_MAX_RETRIES = int(os.environ.get('TABGPT_OPENAI_MAX_RETRIES', 5))
+OPENAI_BACKOFF_BASE = 0.5
+OPENAI_BACKOFF_MAX = 30.0
+
+# Batched mode: prompts are packed into groups of at most BATCH_TOKEN_BUDGET
+# prompt tokens (and BATCH_MAX_PROMPTS prompts), groups are sent concurrently
+BATCH_TOKEN_BUDGET = int(os.environ.get('TABGPT_BATCH_TOKEN_BUDGET', 2000))
+BATCH_MAX_PROMPTS = int(os.environ.get('TABGPT_BATCH_MAX_PROMPTS', 40))
+BATCH_MAX_WORKERS = int(os.environ.get('TABGPT_BATCH_MAX_WORKERS', 8))
+# Marks per resumable chunk, see chunked.run_chunked
+CHUNK_SIZE = int(os.environ.get('TABGPT_CHUNK_SIZE', 400))
+
+# Response cache: with temperature 0 the same request gives the same answer, so
+# answers are cached per prompt. Set TABGPT_CACHE_PATH to keep them across restarts.
+response_cache = ResponseCache(
+    path=os.environ.get('TABGPT_CACHE_PATH'),
+    max_entries=int(os.environ.get('TABGPT_CACHE_MAX_ENTRIES', 10000)),
+    max_disk_entries=int(os.environ.get('TABGPT_CACHE_MAX_DISK_ENTRIES', 100000)),
+    ttl=float(os.environ.get('TABGPT_CACHE_TTL', 7 * 24 * 3600)),
+    table='chat_gpt_query'
+)
+metrics.register_cache('chat_gpt_query', response_cache)
+
+BATCH_INSTRUCTIONS = {
+    "role": "system",
+    "content": "You will receive a JSON array of separate requests. Answer each request independently "
+               "and reply with ONLY a JSON array of strings, one answer per request, in the same order."
+}
+
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Returns the (approximate) number of tokens in text"""
+    global _encoding
+    if TIKTOKEN_AVAILABLE and _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(MODEL)
+        except Exception:
+            # Unknown model or the encoding could not be downloaded
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+_openai_client = None
+_openai_client_pid = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Returns the process-wide OpenAI client, creating it on first use"""
+    global _openai_client, _openai_client_pid
+    # Connection pools must not be shared with forked worker processes
+    if _openai_client is None or _openai_client_pid != os.getpid():
+        with _openai_client_lock:
+            if _openai_client is None or _openai_client_pid != os.getpid():
+                http_client = openai.DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                    ),
+                    timeout=OPENAI_TIMEOUT
+                )
+                _openai_client = openai.OpenAI(
+                    api_key=os.environ.get('OPENAI_API_KEY'),
+                    http_client=http_client,
+                    max_retries=0  # retries are handled by _complete
+                )
+                _openai_client_pid = os.getpid()
+    return _openai_client
+
+
+def warmup():
+    """Creates the OpenAI client and loads the tokenizer ahead of the first query"""
+    get_openai_client()
+    count_tokens("")
+
+
+def _is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            # An exhausted quota will not recover by waiting
+            return getattr(error, 'code', None) != 'insufficient_quota'
+        return error.status_code >= 500
+    return False
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before the next attempt, at most OPENAI_BACKOFF_MAX"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after_ms = response.headers.get('retry-after-ms')
+        retry_after = response.headers.get('retry-after')
+        try:
+            if retry_after_ms is not None:
+                return min(OPENAI_BACKOFF_MAX, float(retry_after_ms) / 1000)
+            if retry_after is not None:
+                return min(OPENAI_BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            try:
+                return min(OPENAI_BACKOFF_MAX, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    backoff = min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt)
+    return backoff * (0.5 + random.random() / 2)
+
+
+def _complete(messages, max_tokens):
+    openai_client = get_openai_client()
+    # What is left of the evaluation, or a whole budget for a call outside run_chunked
+    finish_by = deadline() or time.monotonic() + TIME_BUDGET
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            response = openai_client.chat.completions.create(
+                model=MODEL,
+                temperature=TEMPERATURE,
+                max_tokens=max_tokens,
+                messages=messages
+            )
+            if response.usage is not None:
+                metrics.record_tokens('chat_gpt_query', MODEL, response.usage.prompt_tokens,
+                                      response.usage.completion_tokens)
+            return response.choices[0].message.content
+        except Exception as e:
+            if attempt == OPENAI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            # TabPy cancels the evaluation at its timeout, so don't wait past the time budget
+            if time.monotonic() + delay > finish_by:
+                raise
+            print(f"OpenAI request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _cache_key(prompt):
+    return make_key(MODEL, TEMPERATURE, MAX_TOKENS, SYSTEM_MESSAGES, prompt)
+
+
+def _batch_cache_key(prompt):
+    # An answer parsed from a batched reply comes from a different request than _ask
+    # sends, so it is only served to batches, never to single-prompt calls
+    return make_key(MODEL, TEMPERATURE, MAX_TOKENS, SYSTEM_MESSAGES, BATCH_INSTRUCTIONS, 'batch', prompt)
+
+
+def _ask(prompt):
+    try:
+        return _complete(SYSTEM_MESSAGES + [{"role": "user", "content": prompt}], MAX_TOKENS)
+    except Exception as e:
+        print(f"Error: {e}")
+        metrics.record_error('chat_gpt_query')
+        return f"Error: {str(e)}"
+
+
+@metrics.instrumented('chat_gpt_query')
 def chat_gpt_query(prompt):
+    # TabPy passes _arg1 as the full list of marks
+    if isinstance(prompt, (list, tuple)):
+        return run_chunked('chat_gpt_query', chat_gpt_query_batch, prompt, CHUNK_SIZE)
+    key = _cache_key(str(prompt))
+    message = response_cache.get(key)
+    if message is None:
+        message = _ask(str(prompt))
+        if not message.startswith("Error: "):
+            response_cache.set(key, message)
+    return message
+
+
+def group_prompts(prompts, token_budget=BATCH_TOKEN_BUDGET, max_prompts=BATCH_MAX_PROMPTS):
+    """Splits prompts into consecutive groups that fit the token budget"""
+    groups = []
+    current = []
+    current_tokens = 0
+    for prompt in prompts:
+        tokens = count_tokens(prompt)
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_prompts):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(prompt)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _parse_answers(content, expected):
+    content = (content or "").strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        content = content[content.find("["):]
+    answers = json.loads(content)
+    if not isinstance(answers, list) or len(answers) != expected:
+        raise ValueError(f"expected {expected} answers, got {len(answers) if isinstance(answers, list) else 'no list'}")
+    return [str(answer) for answer in answers]
+
+
+def _query_group(group):
+    """Returns the answers of a group, and whether they were parsed from a batched reply"""
+    if len(group) == 1:
+        return [_ask(group[0])], False
     try:
-        openai_client = openai.OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1",
-            temperature=0.0,
-            max_tokens=150,
-            messages=[
-                {"role": "system", "content": "You are TableauAI a powerful AI trained in Tableau calculations."},
-                {"role": "system", "content": "Only perform what is asked of you.  Do NOT provide explanations or suggestions. Never use punctuations"},
-                {"role": "system", "content": "Ensure groups, labels and other naming conventions you use are identical."},
-                {"role": "user", "content": str(prompt)}
-            ]
+        content = _complete(
+            SYSTEM_MESSAGES + [BATCH_INSTRUCTIONS, {"role": "user", "content": json.dumps(group)}],
+            MAX_TOKENS * len(group)
         )
-        message = response.choices[0].message.content
-        print(message)
-        return message
     except Exception as e:
+        # _complete has used up its retries or the error will not recover: asking
+        # prompt by prompt would only send more requests to a failing API
         print(f"Error: {e}")
-        return f"Error: {str(e)}"
+        metrics.record_error('chat_gpt_query', len(group))
+        return [f"Error: {str(e)}"] * len(group), False
+    try:
+        return _parse_answers(content, len(group)), True
+    except ValueError as e:
+        # The model did not honour the batch format, answer the group one by one
+        print(f"Batch of {len(group)} prompts failed ({e}), retrying individually")
+        return [_ask(prompt) for prompt in group], False
+
+
+def chat_gpt_query_batch(prompts):
+    """Queries ChatGPT for a list of prompts, returns a list of answers aligned with the input"""
+    prompts = [str(prompt) for prompt in prompts]
+    # Marks often repeat the same prompt, only ask each distinct prompt once
+    keys = {prompt: _cache_key(prompt) for prompt in dict.fromkeys(prompts)}
+    batch_keys = {prompt: _batch_cache_key(prompt) for prompt in keys}
+    cached = response_cache.get_many(list(keys.values()) + list(batch_keys.values()))
+    # Prefer the answer of the prompt's own request
+    answers = {prompt: cached[batch_keys[prompt]] for prompt in keys if batch_keys[prompt] in cached}
+    answers.update({prompt: cached[key] for prompt, key in keys.items() if key in cached})
+
+    groups = group_prompts([prompt for prompt in keys if prompt not in answers])
+    if groups:
+        # Every group runs in a copy of this context, so its retries see the evaluation's deadline
+        contexts = [contextvars.copy_context() for _ in groups]
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(groups))) as executor:
+            results = list(executor.map(lambda context, group: context.run(_query_group, group), contexts, groups))
 
+        fresh = {}
+        for group, (group_answers, batched) in zip(groups, results):
+            for prompt, answer in zip(group, group_answers):
+                answers[prompt] = answer
+                if not answer.startswith("Error: "):
+                    fresh[(batch_keys if batched else keys)[prompt]] = answer
+        response_cache.set_many(fresh)
+    return [answers[prompt] for prompt in prompts]
@@ -0,0 +1,153 @@
+# chunked.py - chunked, resumable evaluation for deployed TabPy functions
+import configparser
+import contextvars
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from response_cache import make_key
+
+TABPY_CONFIG = os.environ.get('TABPY_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tabpy_config.conf'))
+JOB_STORE_PATH = os.environ.get('TABGPT_JOB_STORE_PATH', os.path.join(tempfile.gettempdir(), 'tabgpt_jobs.sqlite'))
+# Unfinished jobs older than this are dropped
+JOB_TTL = float(os.environ.get('TABGPT_JOB_TTL', 24 * 3600))
+
+
+def _evaluate_timeout():
+    config = configparser.ConfigParser()
+    config.read(TABPY_CONFIG)
+    return float(config.get('TabPy', 'TABPY_EVALUATE_TIMEOUT', fallback=30))
+
+
+# Stop starting new chunks once this share of TABPY_EVALUATE_TIMEOUT is used
+TIME_BUDGET = float(os.environ.get('TABGPT_TIME_BUDGET', 0.75 * _evaluate_timeout()))
+# Until the time per mark of a function has been measured, its first chunk is this
+# share of the chunk size
+FIRST_CHUNK_SHARE = 0.1
+
+# Seconds per mark last measured for each function in this process
+_seconds_per_item = {}
+
+# time.monotonic() by which the running evaluation has to finish, None outside run_chunked
+_deadline = contextvars.ContextVar('tabgpt_deadline', default=None)
+
+
+def deadline():
+    """time.monotonic() at which the time budget of the running evaluation is used up, None outside run_chunked"""
+    return _deadline.get()
+
+
+class JobStore:
+    """Keeps the finished chunks of each job in SQLite, by first mark, until the job completes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    def _connect(self):
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS parts (job_id TEXT NOT NULL, start INTEGER NOT NULL, '
+                'result TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (job_id, start))'
+            )
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def load(self, job_id):
+        with self._lock:
+            connection = self._connect()
+            connection.execute('DELETE FROM parts WHERE created_at < ?', (time.time() - JOB_TTL,))
+            rows = connection.execute('SELECT start, result FROM parts WHERE job_id = ?', (job_id,)).fetchall()
+        return {start: json.loads(result) for start, result in rows}
+
+    def save(self, job_id, start, result):
+        with self._lock:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO parts (job_id, start, result, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, start, json.dumps(result), time.time())
+            )
+
+    def delete(self, job_id):
+        with self._lock:
+            self._connect().execute('DELETE FROM parts WHERE job_id = ?', (job_id,))
+
+
+job_store = JobStore(JOB_STORE_PATH)
+
+
+def run_chunked(name, fn, items, chunk_size, time_budget=None):
+    """Applies a list-in/list-out fn to items in chunks, within time_budget seconds.
+
+    Chunks hold at most chunk_size items, fewer when the measured time per item says
+    a full chunk would run past the budget. Finished chunks are kept in the job store.
+    If the budget runs out, the remaining marks are returned as None, and the next
+    evaluation of the same input carries on from the first unfinished mark. While it
+    runs, deadline() tells fn when the budget of the whole evaluation is used up.
+    """
+    time_budget = TIME_BUDGET if time_budget is None else time_budget
+    started = time.monotonic()
+    token = _deadline.set(started + time_budget)
+    try:
+        return _run_chunks(name, fn, list(items), chunk_size, time_budget, started)
+    finally:
+        _deadline.reset(token)
+
+
+def _run_chunks(name, fn, items, chunk_size, time_budget, started):
+    job_id = make_key(name, chunk_size, items)
+
+    results = job_store.load(job_id)
+    starts = sorted(results)
+    computed = 0
+    slowest = None
+    position = 0
+    while position < len(items):
+        if position in results:
+            position += len(results[position])
+            continue
+        # Up to the next chunk a previous evaluation finished
+        size = min([chunk_size, len(items) - position] + [start - position for start in starts if start > position])
+        seconds_per_item = slowest if slowest is not None else _seconds_per_item.get(name)
+        if seconds_per_item is None:
+            size = max(1, min(size, int(chunk_size * FIRST_CHUNK_SHARE)))
+        else:
+            size = min(size, int((time_budget - (time.monotonic() - started)) / max(seconds_per_item, 1e-9)))
+            # Do not start a chunk that would likely run past the budget, but always
+            # make progress on at least one mark
+            if size < 1:
+                if computed:
+                    break
+                size = 1
+
+        chunk_started = time.monotonic()
+        results[position] = fn(items[position:position + size])
+        _seconds_per_item[name] = (time.monotonic() - chunk_started) / size
+        slowest = max(slowest or 0.0, _seconds_per_item[name])
+        computed += 1
+        job_store.save(job_id, position, results[position])
+        position += size
+
+    output = []
+    position = 0
+    while position < len(items):
+        if position in results:
+            output.extend(results[position])
+            position += len(results[position])
+        else:
+            output.append(None)
+            position += 1
+
+    done = sum(len(result) for result in results.values())
+    if done == len(items):
+        job_store.delete(job_id)
+    else:
+        print(f"{name}: {done} of {len(items)} marks done, refresh to continue")
+    return output
@@ -1,21 +1,33 @@
-# deploy_both.py
+# deploy_both.py - deploys every endpoint listed in endpoints.json
+# Usage: python deploy_both.py [path/to/endpoints.json]
 import sys
-sys.path.append('/Users/Dev/tabpy')  # Add path to find your modules
 
 from tabpy.tabpy_tools.client import Client
 
-# Import both functions
-from chat_gpt_query import chat_gpt_query
-from sentiment_analysis import sentiment_analysis
+from manifest import MANIFEST_PATH, load_manifest, missing_dependencies, load_function
 
-# Create client
-client = Client('http://localhost:9004/')
+manifest_path = sys.argv[1] if len(sys.argv) > 1 else MANIFEST_PATH
+manifest = load_manifest(manifest_path)
+
+# Check every endpoint before deploying any of them
+for endpoint in manifest['endpoints']:
+    missing = missing_dependencies(endpoint)
+    if missing:
+        sys.exit(f"Cannot deploy {endpoint['name']}: missing {', '.join(missing)}")
+    missing = missing_dependencies(endpoint, 'optional_dependencies')
+    if missing:
+        print(f"Warning: deploying {endpoint['name']} without its optional {', '.join(missing)}")
 
-# Deploy both functions
-print("Deploying chat_gpt_query...")
-client.deploy('chat_gpt_query', chat_gpt_query, 'Queries ChatGPT using OpenAI API', override=True)
+# Create client
+client = Client(manifest.get('server', 'http://localhost:9004/'))
 
-print("Deploying sentiment_analysis...")
-client.deploy('sentiment_analysis', sentiment_analysis, 'Returns sentiment score of text', override=True)
+for endpoint in manifest['endpoints']:
+    print(f"Deploying {endpoint['name']} v{endpoint['version']}...")
+    client.deploy(
+        endpoint['name'],
+        load_function(endpoint),
+        f"{endpoint['description']} (v{endpoint['version']})",
+        override=True
+    )
 
-print("Both functions deployed successfully!")
\ No newline at end of file
+print(f"{len(manifest['endpoints'])} functions deployed successfully!")
@@ -0,0 +1,46 @@
+# manifest.py - endpoint manifest shared by deploy_both.py and start_tabpy.py
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import time
+
+TABGPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.environ.get('TABGPT_MANIFEST', os.path.join(TABGPT_DIR, 'endpoints.json'))
+
+# The endpoint modules live next to this file
+if TABGPT_DIR not in sys.path:
+    sys.path.insert(0, TABGPT_DIR)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def missing_dependencies(endpoint, key='dependencies'):
+    """Returns the dependencies of an endpoint that cannot be imported
+
+    key='optional_dependencies' checks the ones the endpoint works without, only slower or less exact.
+    """
+    return [name for name in endpoint.get(key, []) if importlib.util.find_spec(name) is None]
+
+
+def load_function(endpoint):
+    module = importlib.import_module(endpoint['module'])
+    return getattr(module, endpoint['function'])
+
+
+def preload(path=MANIFEST_PATH):
+    """Imports every endpoint module and runs its warm-up hook (models, API clients)"""
+    for endpoint in load_manifest(path)['endpoints']:
+        started = time.time()
+        try:
+            module = importlib.import_module(endpoint['module'])
+            if endpoint.get('warmup'):
+                getattr(module, endpoint['warmup'])()
+            print(f"Preloaded {endpoint['name']} in {time.time() - started:.2f}s")
+        except Exception as e:
+            # A failed warm-up only costs speed, the endpoint still loads on first use
+            print(f"Warm-up of {endpoint['name']} failed: {e}")
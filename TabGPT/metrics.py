@@ -0,0 +1,295 @@
+# metrics.py - latency, row, token, cost, cache and error metrics for deployed endpoints
+import bisect
+import functools
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Every process serving an endpoint (from its first call, see instrumented) writes its
+# snapshot every METRICS_INTERVAL seconds to its own file
+# next to METRICS_FILE (tabgpt_metrics.<pid>.json). read_snapshots() merges them,
+# and the merged snapshot is served on http://localhost:<METRICS_PORT>/metrics
+# when a port is set.
+METRICS_FILE = os.environ.get('TABGPT_METRICS_FILE', os.path.join(tempfile.gettempdir(), 'tabgpt_metrics.json'))
+METRICS_INTERVAL = float(os.environ.get('TABGPT_METRICS_INTERVAL', 10))
+# Process files not rewritten for this long belong to processes that have exited
+METRICS_STALE = 3 * METRICS_INTERVAL
+METRICS_PORT = int(os.environ.get('TABGPT_METRICS_PORT', 0))
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+# Percentiles are computed over the most recent calls
+LATENCY_SAMPLES = 10000
+
+# USD per million prompt / completion tokens
+TOKEN_PRICES = {
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+}
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.cache = None
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        buckets = {str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.bucket_counts)}
+        buckets['+Inf'] = self.bucket_counts[-1]
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'latency_seconds': {
+                'p50': percentile(50),
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': latencies[-1] if latencies else None,
+                'buckets': buckets,
+            },
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost_usd': round(self.cost_usd, 6),
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+
+_endpoints = {}
+_lock = threading.Lock()
+_exporter_pid = None
+
+
+def _endpoint(name):
+    if name not in _endpoints:
+        _endpoints[name] = EndpointMetrics()
+    return _endpoints[name]
+
+
+def record_call(name, seconds, rows, failed=False):
+    with _lock:
+        endpoint = _endpoint(name)
+        endpoint.calls += 1
+        endpoint.rows += rows
+        endpoint.errors += int(failed)
+        endpoint.latencies.append(seconds)
+        endpoint.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+
+def record_error(name, count=1):
+    """Counts errors that an endpoint reports in its result instead of raising"""
+    with _lock:
+        _endpoint(name).errors += count
+
+
+def record_tokens(name, model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = TOKEN_PRICES.get(model, (0.0, 0.0))
+    with _lock:
+        endpoint = _endpoint(name)
+        endpoint.prompt_tokens += prompt_tokens
+        endpoint.completion_tokens += completion_tokens
+        endpoint.cost_usd += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+def register_cache(name, cache):
+    """Reports the hit rate of a ResponseCache with the endpoint's metrics"""
+    with _lock:
+        _endpoint(name).cache = cache
+
+
+def snapshot():
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'timestamp': time.time(),
+            'endpoints': {name: endpoint.snapshot() for name, endpoint in _endpoints.items()},
+        }
+
+
+def process_file(path=METRICS_FILE, pid=None):
+    """The snapshot file of one process: path with the pid before the extension"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def write_snapshot(path=METRICS_FILE):
+    path = process_file(path)
+    # Write to a temporary file first so readers never see a partial snapshot
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _bucket_percentile(buckets, p, maximum):
+    """Upper bound of the latency bucket holding the p-th percentile"""
+    counts = [buckets.get(str(bound), 0) for bound in LATENCY_BUCKETS] + [buckets.get('+Inf', 0)]
+    total = sum(counts)
+    if not total:
+        return None
+    rank = min(total - 1, int(p / 100 * total))
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS + [maximum], counts):
+        seen += count
+        if seen > rank:
+            return min(bound, maximum) if maximum is not None else bound
+    return maximum
+
+
+def merge_snapshots(snapshots):
+    """Adds up the endpoint metrics of several process snapshots.
+
+    Percentiles can't be combined exactly, so the merged ones are the upper bound
+    of the latency bucket they fall in.
+    """
+    endpoints = {}
+    for process in snapshots:
+        for name, data in process['endpoints'].items():
+            total = endpoints.setdefault(name, {
+                'calls': 0, 'errors': 0, 'rows': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'cost_usd': 0.0, 'buckets': {}, 'max': None, 'cache': None,
+            })
+            for counter in ('calls', 'errors', 'rows', 'prompt_tokens', 'completion_tokens', 'cost_usd'):
+                total[counter] += data[counter]
+            latency = data['latency_seconds']
+            for bound, count in latency['buckets'].items():
+                total['buckets'][bound] = total['buckets'].get(bound, 0) + count
+            if latency['max'] is not None:
+                total['max'] = max(total['max'] or 0.0, latency['max'])
+            if data['cache'] is not None:
+                cache = total['cache'] or {'hits': 0, 'misses': 0, 'evictions': 0, 'memory_entries': 0}
+                for counter in cache:
+                    cache[counter] += data['cache'][counter]
+                total['cache'] = cache
+
+    merged = {}
+    for name, total in endpoints.items():
+        cache = total['cache']
+        if cache is not None:
+            lookups = cache['hits'] + cache['misses']
+            cache['hit_rate'] = cache['hits'] / lookups if lookups else 0.0
+        merged[name] = {
+            'calls': total['calls'],
+            'errors': total['errors'],
+            'rows': total['rows'],
+            'latency_seconds': {
+                'p50': _bucket_percentile(total['buckets'], 50, total['max']),
+                'p95': _bucket_percentile(total['buckets'], 95, total['max']),
+                'p99': _bucket_percentile(total['buckets'], 99, total['max']),
+                'max': total['max'],
+                'buckets': total['buckets'],
+            },
+            'prompt_tokens': total['prompt_tokens'],
+            'completion_tokens': total['completion_tokens'],
+            'cost_usd': round(total['cost_usd'], 6),
+            'cache': cache,
+        }
+    return {
+        'pids': sorted(process['pid'] for process in snapshots),
+        'timestamp': time.time(),
+        'endpoints': merged,
+    }
+
+
+def read_snapshots(path=METRICS_FILE):
+    """Merges the snapshot files of the processes that are still writing them"""
+    root, ext = os.path.splitext(path)
+    snapshots = []
+    for process_path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+        try:
+            if time.time() - os.path.getmtime(process_path) > METRICS_STALE:
+                continue
+            with open(process_path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            # Removed or replaced while reading
+            continue
+    return merge_snapshots(snapshots)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        # This process's own file first, so its latest calls are included
+        write_snapshot()
+        body = json.dumps(read_snapshots(), indent=2).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_periodically():
+    while True:
+        time.sleep(METRICS_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError as e:
+            print(f"Could not write metrics to {METRICS_FILE}: {e}")
+
+
+def start_exporter():
+    """Starts the metrics file writer (and HTTP endpoint) once per process"""
+    global _exporter_pid
+    with _lock:
+        if _exporter_pid == os.getpid():
+            return
+        _exporter_pid = os.getpid()
+    threading.Thread(target=_write_periodically, name='tabgpt-metrics', daemon=True).start()
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', METRICS_PORT), _MetricsHandler)
+        except OSError as e:
+            # Another TabPy process already serves the port
+            print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+            return
+        threading.Thread(target=server.serve_forever, name='tabgpt-metrics-http', daemon=True).start()
+
+
+def instrumented(name):
+    """Decorator recording latency, input rows and raised errors of an endpoint"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(arg, *args, **kwargs):
+            start_exporter()
+            rows = len(arg) if isinstance(arg, (list, tuple)) else 1
+            started = time.perf_counter()
+            failed = False
+            try:
+                return fn(arg, *args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                record_call(name, time.perf_counter() - started, rows, failed)
+        return wrapper
+    return decorator
+
+
+if __name__ == '__main__':
+    print(json.dumps(read_snapshots(), indent=2))
@@ -0,0 +1,158 @@
+# response_cache.py - content-addressed cache for deployed TabPy functions
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(*parts):
+    """Returns a stable hash of the JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Two-level cache: a bounded in-memory LRU in front of an optional SQLite file.
+
+    Entries expire after `ttl` seconds (None keeps them forever). The memory layer
+    holds at most `max_entries` items, the SQLite layer at most `max_disk_entries`;
+    the least recently used entries are evicted first. The SQLite file can be
+    shared by several processes and survives TabPy restarts.
+    """
+
+    def __init__(self, path=None, max_entries=10000, max_disk_entries=100000, ttl=None, table='responses'):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._writes = 0
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, reopen in child processes
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)')
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get_many(self, keys):
+        """Returns a dict with the cached value of every key that is present"""
+        now = time.time()
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    if entry is not None:
+                        del self._memory[key]
+                    missing.append(key)
+
+            if missing and self.path:
+                connection = self._connect()
+                disk_hits = []
+                # Stay below SQLite's bound-parameter limit
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = connection.execute(
+                        f'SELECT key, value, created_at FROM {self.table} WHERE key IN ({",".join("?" * len(batch))})',
+                        batch
+                    ).fetchall()
+                    for key, value, created_at in rows:
+                        if not self._expired(created_at, now):
+                            found[key] = json.loads(value)
+                            disk_hits.append(key)
+                            self._remember(key, found[key], created_at)
+                if disk_hits:
+                    connection.executemany(
+                        f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?',
+                        [(now, key) for key in disk_hits]
+                    )
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items):
+        """Stores a dict of key -> JSON-serializable value"""
+        now = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value, now)
+            if self.path and items:
+                connection = self._connect()
+                connection.executemany(
+                    f'INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                    [(key, json.dumps(value), now, now) for key, value in items.items()]
+                )
+                self._writes += len(items)
+                if self._writes >= 100:
+                    self._writes = 0
+                    self._evict_disk(connection, now)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self, connection, now):
+        if self.ttl is not None:
+            connection.execute(f'DELETE FROM {self.table} WHERE created_at < ?', (now - self.ttl,))
+        count = connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        if count > self.max_disk_entries:
+            connection.execute(
+                f'DELETE FROM {self.table} WHERE key IN '
+                f'(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)',
+                (count - self.max_disk_entries,)
+            )
+            self.evictions += count - self.max_disk_entries
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.path:
+                self._connect().execute(f'DELETE FROM {self.table}')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self._memory),
+        }
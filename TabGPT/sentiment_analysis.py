@@ -1,24 +1,111 @@
 # sentiment_analysis.py - ONLY the function
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from concurrent.futures import ProcessPoolExecutor
+from response_cache import ResponseCache, make_key
+from chunked import run_chunked
+import metrics
+import tempfile
+import threading
 import nltk
+import os
 
-# Download only if not already available
-try:
-    # Test if vader_lexicon is available
-    SentimentIntensityAnalyzer()
-except LookupError:
-    # Download only if needed
-    nltk.download('vader_lexicon', quiet=True)
+# Lists at least this long are scored across a process pool
+POOL_THRESHOLD = int(os.environ.get('TABGPT_SENTIMENT_POOL_THRESHOLD', 50000))
+POOL_WORKERS = int(os.environ.get('TABGPT_SENTIMENT_POOL_WORKERS', os.cpu_count() or 1))
+POOL_CHUNK_SIZE = 5000
+# Marks per resumable chunk, see chunked.run_chunked
+CHUNK_SIZE = int(os.environ.get('TABGPT_SENTIMENT_CHUNK_SIZE', 100000))
 
+# Scores are memoized by text hash in a SQLite file shared by all TabPy worker
+# processes, so repeated texts ("N/A", templated feedback) are scored once
+sentiment_cache = ResponseCache(
+    path=os.environ.get('TABGPT_SENTIMENT_CACHE_PATH',
+                        os.path.join(tempfile.gettempdir(), 'tabgpt_sentiment_cache.sqlite')),
+    max_entries=int(os.environ.get('TABGPT_SENTIMENT_CACHE_MAX_ENTRIES', 100000)),
+    max_disk_entries=int(os.environ.get('TABGPT_SENTIMENT_CACHE_MAX_DISK_ENTRIES', 1000000)),
+    table='sentiment_scores'
+)
+metrics.register_cache('sentiment_analysis', sentiment_cache)
+
+_analyzer = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_analyzer():
+    """Returns the process-wide analyzer, loading the VADER lexicon only once"""
+    global _analyzer
+    if _analyzer is None:
+        try:
+            _analyzer = SentimentIntensityAnalyzer()
+        except LookupError:
+            # Download only if needed
+            nltk.download('vader_lexicon', quiet=True)
+            _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def warmup():
+    """Loads the VADER lexicon ahead of the first query"""
+    get_analyzer()
+
+
+def _compound_scores(texts):
+    sia = get_analyzer()
+    return [None if text is None else sia.polarity_scores(str(text))['compound'] for text in texts]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Workers load the lexicon once when they start, not per chunk
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, initializer=get_analyzer)
+        return _pool
+
+
+def _score_unique(texts):
+    if len(texts) < POOL_THRESHOLD or POOL_WORKERS < 2:
+        return _compound_scores(texts)
+    chunks = [texts[i:i + POOL_CHUNK_SIZE] for i in range(0, len(texts), POOL_CHUNK_SIZE)]
+    scores = []
+    for chunk_scores in _get_pool().map(_compound_scores, chunks):
+        scores.extend(chunk_scores)
+    return scores
+
+
+def sentiment_scores(texts):
+    """Returns the compound sentiment score of every text, aligned with the input"""
+    texts = [None if text is None else str(text) for text in texts]
+    # Only distinct texts that are not cached yet get scored
+    keys = {text: make_key('vader', nltk.__version__, text) for text in dict.fromkeys(texts) if text is not None}
+    cached = sentiment_cache.get_many(list(keys.values()))
+    scores = {text: cached[key] for text, key in keys.items() if key in cached}
+
+    missing = [text for text in keys if text not in scores]
+    if missing:
+        fresh = dict(zip(missing, _score_unique(missing)))
+        scores.update(fresh)
+        sentiment_cache.set_many({keys[text]: score for text, score in fresh.items()})
+    return [None if text is None else scores[text] for text in texts]
+
+
+@metrics.instrumented('sentiment_analysis')
 def sentiment_analysis(text):
     """Returns sentiment score of text"""
+    # TabPy passes _arg1 as the full list of marks: one compound score per mark
+    if isinstance(text, (list, tuple)):
+        try:
+            return run_chunked('sentiment_analysis', sentiment_scores, text, CHUNK_SIZE)
+        except Exception as e:
+            print(f"Error: {e}")
+            metrics.record_error('sentiment_analysis')
+            return [None] * len(text)
     try:
-        # Create a SentimentIntensityAnalyzer object
-        sia = SentimentIntensityAnalyzer()
-        
         # Get the sentiment scores for the text
-        sentiment = sia.polarity_scores(str(text))
-        
+        sentiment = get_analyzer().polarity_scores(str(text))
+
         return sentiment
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        metrics.record_error('sentiment_analysis')
+        return {"error": str(e)}
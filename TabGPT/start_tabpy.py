@@ -10,6 +10,21 @@ if __name__ == '__main__':
     os.environ['OBJC_DISABLE_INITIALIZE_FORK_SAFETY'] = 'YES'
     os.environ['MULTIPROCESSING_START_METHOD'] = 'spawn'
     
+    # Warm up the deployed endpoints (VADER lexicon, OpenAI client) before
+    # the first query arrives
+    from manifest import preload
+    preload()
+
     # Now import and run TabPy
     from tabpy.tabpy import main
     main()
+
+# Processes started with 'spawn' re-import this file as __mp_main__. Those are the
+# sentiment pool's workers, so they only need the VADER lexicon.
+if __name__ == '__mp_main__':
+    try:
+        from sentiment_analysis import get_analyzer
+        get_analyzer()
+    except Exception as e:
+        # A failed warm-up only costs speed, the pool initializer loads it again
+        print(f"Warm-up of sentiment_analysis failed: {e}")
@@ -0,0 +1,94 @@
+import json
+import os
+
+import httpx
+import openai
+import pytest
+
+pytest.importorskip('tabpy')
+
+import chat_gpt_query
+from response_cache import ResponseCache
+
+
+class MockOpenAI:
+    """In-process chat completions API: answers every prompt with 'answer to <prompt>'
+
+    Batched requests get a JSON array of answers, or batch_reply when it is set.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.batch_reply = None
+
+    def handle(self, request):
+        messages = json.loads(request.content)['messages']
+        batched = chat_gpt_query.BATCH_INSTRUCTIONS in messages
+        prompt = messages[-1]['content']
+        self.requests.append(json.loads(prompt) if batched else prompt)
+        if batched:
+            content = self.batch_reply or json.dumps([f"answer to {p}" for p in json.loads(prompt)])
+        else:
+            content = f"answer to {prompt}"
+        return httpx.Response(200, json={
+            'id': 'chatcmpl-test',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': chat_gpt_query.MODEL,
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+        })
+
+    def prompts_sent(self):
+        """Every prompt sent, whether on its own or in a batch"""
+        return [p for request in self.requests for p in (request if isinstance(request, list) else [request])]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    mock = MockOpenAI()
+    client = openai.OpenAI(api_key='test', max_retries=0,
+                           http_client=httpx.Client(transport=httpx.MockTransport(mock.handle)))
+    monkeypatch.setattr(chat_gpt_query, '_openai_client', client)
+    monkeypatch.setattr(chat_gpt_query, '_openai_client_pid', os.getpid())
+    monkeypatch.setattr(chat_gpt_query, 'response_cache', ResponseCache())
+    # Estimated token counts, so tiktoken never downloads its encoding
+    monkeypatch.setattr(chat_gpt_query, '_encoding', False)
+    return mock
+
+
+def test_answers_stay_aligned_when_prompts_repeat(api):
+    prompts = ['b', 'a', 'b', 'c', 'a', 'b']
+
+    answers = chat_gpt_query.chat_gpt_query_batch(prompts)
+
+    assert answers == [f"answer to {p}" for p in prompts]
+    # Each distinct prompt is asked once, in a single batch
+    assert api.requests == [['b', 'a', 'c']]
+
+
+def test_unparseable_batch_reply_falls_back_to_single_prompts(api):
+    api.batch_reply = "Here are the answers: 1. answer to a 2. answer to b"
+
+    answers = chat_gpt_query.chat_gpt_query_batch(['a', 'b', 'a'])
+
+    assert answers == ['answer to a', 'answer to b', 'answer to a']
+    assert api.requests == [['a', 'b'], 'a', 'b']
+    # Answers of single-prompt requests are cached under the single-prompt key
+    assert chat_gpt_query.chat_gpt_query('a') == 'answer to a'
+    assert len(api.requests) == 3
+
+
+def test_batched_answers_are_only_served_to_batches(api):
+    chat_gpt_query.chat_gpt_query_batch(['a', 'b'])
+    assert api.requests == [['a', 'b']]
+
+    # A batch hits the batch key
+    assert chat_gpt_query.chat_gpt_query_batch(['b', 'a']) == ['answer to b', 'answer to a']
+    assert len(api.requests) == 1
+
+    # A single-prompt call misses it and sends its own request
+    assert chat_gpt_query.chat_gpt_query('a') == 'answer to a'
+    assert api.requests[1:] == ['a']
+    assert api.prompts_sent() == ['a', 'b', 'a']
@@ -0,0 +1,134 @@
+# Benchmark the BigQuery extract pipelines of bigquery_extract against a local fake table
+# Usage: python benchmark_extract.py [--rows 100000 1000000] [--formats hyper parquet csv]
+#            [--modes query staged streams insert merge] [--schema events] [--latency 0.05] [--workers 4]
+#            [--output results.json] [--baseline previous.json]
+#
+# Modes: query fetches sliced queries and writes them in order, staged stages them as
+# Parquet first, streams reads one read session's streams. insert and merge stage them
+# too, then load them with the v2.5 notebook's HyperWriter (hyper only). Every run happens in its own
+# process inside a scratch directory, so peak RSS is per run and the outputs are thrown
+# away. Stage times (fetch, convert, stage, write) are summed across threads, so with
+# concurrent fetches they can add up to more than the run's wall time.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import stage_timer
+from benchmark_generators import environment, peak_rss_mib
+from bigquery_extract import BigQueryConfig, BigQueryExtractor
+from fake_bigquery import FakeBigQuerySource, SCHEMAS
+
+DEFAULT_ROWS = [100_000, 1_000_000]
+FORMATS = ['hyper', 'parquet', 'csv']
+MODES = ['query', 'staged', 'streams', 'insert', 'merge']
+# Modes that load the staged chunks with hyper_writer.HyperWriter
+HYPER_WRITER_MODES = ['insert', 'merge']
+
+
+def run_once(mode, file_format, rows, schema, latency, workers):
+    """Runs one benchmark in this process, writing to the current directory, returns its result"""
+    source = FakeBigQuerySource(SCHEMAS[schema], rows, latency=latency)
+    config = BigQueryConfig(
+        project_id='local', source_project='fake', dataset_id='benchmark', table_id=schema,
+        output_format=file_format, output_path='.', max_workers=workers,
+        stage_chunks=mode in ['staged'] + HYPER_WRITER_MODES,
+        hyper_write_mode=mode if mode in HYPER_WRITER_MODES else 'pantab'
+    )
+
+    started = time.perf_counter()
+    stage_timer.start()
+    extractor = BigQueryExtractor(config, source)
+    extracted, output = extractor.extract_streams() if mode == 'streams' else extractor.extract_data()
+    seconds = time.perf_counter() - started
+    if extracted != rows or output is None:
+        raise RuntimeError(f"Extracted {extracted:,} of {rows:,} rows")
+
+    return {
+        'schema': schema,
+        'mode': mode,
+        'format': file_format,
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds),
+        'peak_rss_mib': round(peak_rss_mib(), 1),
+        'output_mib': round(os.path.getsize(output) / 2 ** 20, 1),
+        'stages': {stage: round(elapsed, 3) for stage, elapsed in stage_timer.timings().items()},
+    }
+
+
+def run_isolated(mode, file_format, rows, schema, latency, workers):
+    """Runs one benchmark in a fresh process inside a scratch directory"""
+    with tempfile.TemporaryDirectory(prefix='extract_benchmark_') as scratch:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', mode, file_format, str(rows),
+             '--schema', schema, '--latency', str(latency), '--workers', str(workers)],
+            cwd=scratch, capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} to {file_format} at {rows:,} rows failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline):
+    """Prints rows/sec and peak RSS of results against a previous results file"""
+    previous = {(r['schema'], r['mode'], r['format'], r['rows']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['environment'].get('git_commit') or baseline['environment']['timestamp']}:")
+    for result in results:
+        before = previous.get((result['schema'], result['mode'], result['format'], result['rows']))
+        if before is None:
+            continue
+        speed = result['rows_per_sec'] / before['rows_per_sec'] - 1
+        memory = result['peak_rss_mib'] / before['peak_rss_mib'] - 1
+        print(f"  {result['mode']:<8} {result['format']:<8} {result['rows']:>12,} rows  "
+              f"rows/sec {speed:+.1%}  peak RSS {memory:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the BigQuery extract pipelines against a local fake table')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--schema', choices=sorted(SCHEMAS), default='events')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each query and stream page waits')
+    parser.add_argument('--workers', type=int, default=BigQueryConfig.max_workers, help='max_workers of the extract')
+    parser.add_argument('--output', help='results file (default: extract_benchmark_<timestamp>.json)')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--worker', nargs=3, metavar=('MODE', 'FORMAT', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, file_format, rows = args.worker
+        print(json.dumps(run_once(mode, file_format, int(rows), args.schema, args.latency, args.workers)))
+        return
+
+    results = []
+    for mode in args.modes:
+        for file_format in args.formats:
+            if mode in HYPER_WRITER_MODES and file_format != 'hyper':
+                continue
+            for rows in args.rows:
+                print(f"{mode} to {file_format} at {rows:,} rows...", flush=True)
+                result = run_isolated(mode, file_format, rows, args.schema, args.latency, args.workers)
+                stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result['stages'].items())
+                print(f"  {result['seconds']:.2f}s, {result['rows_per_sec']:,} rows/sec, "
+                      f"peak RSS {result['peak_rss_mib']:,.0f} MiB ({stages})")
+                results.append(result)
+
+    output = args.output or f"extract_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    run = {'schema': args.schema, 'latency': args.latency, 'workers': args.workers}
+    with open(output, 'w') as f:
+        json.dump({'environment': environment(), 'run': run, 'results': results}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# Benchmark the mock data generators and their export
+# Usage: python benchmark_generators.py [--rows 100000 1000000 10000000]
+#            [--generators dummy sample home_loan] [--output results.json] [--baseline previous.json]
+#
+# Every (generator, rows) run happens in its own process inside a scratch
+# directory, so peak RSS is per run and the exported files are thrown away.
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+EXAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROWS = [100_000, 1_000_000, 10_000_000]
+GENERATORS = ['dummy', 'sample', 'home_loan']
+
+
+def _run_dummy(rows):
+    import dummy_data_creator
+    dummy_data_creator.NUM_ROWS = rows
+    dummy_data_creator.main()
+
+
+def _run_sample(rows):
+    import sample_data_v2
+    sample_data_v2.NUM_ROWS = rows
+    sample_data_v2.main()
+
+
+def _run_home_loan(rows):
+    import home_loan_mock_data
+    import stage_timer
+    from export import write_frame
+    df = home_loan_mock_data.generate_loan_application_dataset(num_rows=rows, verbose=False)
+    # Same outputs as the script writes
+    paths = {'csv': 'bendigo_adelaide_bank_loan_applications.csv'}
+    if importlib.util.find_spec('pantab') is not None:
+        paths['hyper'] = 'bendigo_adelaide_bank_loan_applications.hyper'
+    write_frame(df, paths, table='HomeLoans')
+    stage_timer.lap('export')
+
+
+RUNNERS = {'dummy': _run_dummy, 'sample': _run_sample, 'home_loan': _run_home_loan}
+
+
+def peak_rss_mib():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def run_once(generator, rows):
+    """Runs one benchmark in this process, returns its result"""
+    sys.path.insert(0, EXAMPLES_DIR)
+    import stage_timer
+
+    # The generators print progress and summaries; keep only the result on stdout
+    started = time.perf_counter()
+    stage_timer.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        RUNNERS[generator](rows)
+    seconds = time.perf_counter() - started
+
+    return {
+        'generator': generator,
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds),
+        'peak_rss_mib': round(peak_rss_mib(), 1),
+        'stages': {stage: round(elapsed, 3) for stage, elapsed in stage_timer.timings().items()},
+    }
+
+
+def run_isolated(generator, rows):
+    """Runs one benchmark in a fresh process inside a scratch directory"""
+    with tempfile.TemporaryDirectory(prefix='generator_benchmark_') as scratch:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', generator, str(rows)],
+            cwd=scratch, capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{generator} at {rows:,} rows failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=EXAMPLES_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+    }
+
+
+def compare(results, baseline):
+    """Prints rows/sec and peak RSS of results against a previous results file"""
+    previous = {(r['generator'], r['rows']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['environment'].get('git_commit') or baseline['environment']['timestamp']}:")
+    for result in results:
+        before = previous.get((result['generator'], result['rows']))
+        if before is None:
+            continue
+        speed = result['rows_per_sec'] / before['rows_per_sec'] - 1
+        memory = result['peak_rss_mib'] / before['peak_rss_mib'] - 1
+        print(f"  {result['generator']:<10} {result['rows']:>12,} rows  rows/sec {speed:+.1%}  peak RSS {memory:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mock data generators and their export')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--generators', nargs='+', choices=GENERATORS, default=GENERATORS)
+    parser.add_argument('--output', help='results file (default: generator_benchmark_<timestamp>.json)')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--worker', nargs=2, metavar=('GENERATOR', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_once(args.worker[0], int(args.worker[1]))))
+        return
+
+    results = []
+    for generator in args.generators:
+        for rows in args.rows:
+            print(f"{generator} at {rows:,} rows...", flush=True)
+            result = run_isolated(generator, rows)
+            stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result['stages'].items())
+            print(f"  {result['seconds']:.2f}s, {result['rows_per_sec']:,} rows/sec, "
+                  f"peak RSS {result['peak_rss_mib']:,.0f} MiB ({stages})")
+            results.append(result)
+
+    output = args.output or f"generator_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
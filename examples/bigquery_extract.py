@@ -0,0 +1,1201 @@
+# The BigQuery extractor used by Read_from_BQ_into_Hyper_via_Pantab_v3_1.ipynb.
+#
+# It reads through an ExtractSource: BigQuerySource for a real table (needs
+# google-cloud-bigquery and google-cloud-bigquery-storage), or
+# fake_bigquery.FakeBigQuerySource to run the whole pipeline locally.
+#
+#     config = BigQueryConfig(project_id='my-project', source_project='bigquery-public-data',
+#                             dataset_id='samples', table_id='github_timeline')
+#     rows, file = extract_bigquery_data(config)
+import contextlib
+import gc
+import hashlib
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import psutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress log lines
+PROGRESS_SECONDS = 5
+
+
+class ExtractSource:
+    """Where the extractor reads a table from.
+
+    Filters are BigQuery SQL conditions, or None for every row. The extractor calls
+    fetch() and read_stream() from several threads at once.
+    """
+
+    def get_table(self):
+        """Table metadata: schema, num_rows, num_bytes, time_partitioning, range_partitioning
+        and clustering_fields, as on google.cloud.bigquery.Table"""
+        raise NotImplementedError
+
+    def count_rows(self, where: Optional[str]) -> int:
+        raise NotImplementedError
+
+    def quantiles(self, column: str, parts: int, where: Optional[str]) -> List[str]:
+        """APPROX_QUANTILES of column as SQL literals; the first and last are the min and max"""
+        raise NotImplementedError
+
+    def max_value(self, column: str, where: Optional[str]) -> Optional[str]:
+        """Maximum of column as a SQL literal, None if it has no values"""
+        raise NotImplementedError
+
+    def fetch(self, columns: List[str], where: Optional[str]) -> pa.Table:
+        """The rows matching where as one Arrow table"""
+        raise NotImplementedError
+
+    def read_session(self, columns: List[str], where: Optional[str], max_streams: int) -> List[str]:
+        """Split the rows matching where into at most max_streams streams, returns their names"""
+        raise NotImplementedError
+
+    def read_stream(self, stream: str) -> Iterator[pa.RecordBatch]:
+        """Record batches of one stream of a read session"""
+        raise NotImplementedError
+
+
+class BigQuerySource(ExtractSource):
+    """A BigQuery table, queried through google-cloud-bigquery and read through the Storage Read API.
+
+    In Colab the user is authenticated first; elsewhere the application default credentials are used.
+    """
+
+    def __init__(self, project_id: str, source_project: str, dataset_id: str, table_id: str,
+                 max_bytes_billed: Optional[int] = None):
+        from google.cloud import bigquery, bigquery_storage
+        try:
+            from google.colab import auth
+            auth.authenticate_user()
+        except ImportError:
+            pass
+
+        self.project_id = project_id
+        self.table_id = f"{source_project}.{dataset_id}.{table_id}"
+        self.table_path = f"projects/{source_project}/datasets/{dataset_id}/tables/{table_id}"
+        self.client = bigquery.Client(project=project_id)
+        self.read_client = bigquery_storage.BigQueryReadClient()
+        self.job_config = bigquery.QueryJobConfig(maximum_bytes_billed=max_bytes_billed)
+        self._types = bigquery_storage.types
+
+    def _query(self, query: str):
+        return self.client.query(query, job_config=self.job_config)
+
+    def _from(self, where: Optional[str]) -> str:
+        return f"FROM `{self.table_id}` AS t {f'WHERE {where}' if where else ''}"
+
+    def get_table(self):
+        return self.client.get_table(self.table_id)
+
+    def count_rows(self, where: Optional[str]) -> int:
+        return next(iter(self._query(f"SELECT COUNT(*) AS total {self._from(where)}").result()))['total']
+
+    def quantiles(self, column: str, parts: int, where: Optional[str]) -> List[str]:
+        # Boundaries from one pass over the column; FORMAT('%T') returns SQL literals
+        query = f"""
+        SELECT FORMAT('%T', boundary) AS boundary
+        FROM UNNEST((
+            SELECT APPROX_QUANTILES(`{column}`, {parts})
+            {self._from(where)}
+        )) AS boundary WITH OFFSET AS position
+        ORDER BY position
+        """
+        return [row['boundary'] for row in self._query(query).result()]
+
+    def max_value(self, column: str, where: Optional[str]) -> Optional[str]:
+        query = f"SELECT IF(MAX(`{column}`) IS NULL, NULL, FORMAT('%T', MAX(`{column}`))) AS value {self._from(where)}"
+        return next(iter(self._query(query).result()))['value']
+
+    def fetch(self, columns: List[str], where: Optional[str]) -> pa.Table:
+        query = f"SELECT {', '.join(columns)} {self._from(where)}"
+        return self._query(query).to_arrow(bqstorage_client=self.read_client)
+
+    def read_session(self, columns: List[str], where: Optional[str], max_streams: int) -> List[str]:
+        read_session = self._types.ReadSession(table=self.table_path, data_format=self._types.DataFormat.ARROW)
+        read_session.read_options.selected_fields = columns
+        if where:
+            read_session.read_options.row_restriction = where
+        session = self.read_client.create_read_session(
+            parent=f"projects/{self.project_id}",
+            read_session=read_session,
+            max_stream_count=max_streams
+        )
+        return [stream.name for stream in session.streams]
+
+    def read_stream(self, stream: str) -> Iterator[pa.RecordBatch]:
+        for page in self.read_client.read_rows(stream).rows().pages:
+            yield page.to_arrow()
+
+
+@dataclass
+class BigQueryConfig:
+    """Configuration for BigQuery extraction."""
+    project_id: str
+    source_project: str
+    dataset_id: str
+    table_id: str
+    output_format: str = 'hyper'
+    output_path: str = './data'
+    max_bytes_billed: int = 100 * 1024 * 1024 * 1024  # 100GB
+    initial_chunk_size: int = 500_000
+    max_workers: int = 4
+    chunk_size: Optional[int] = None
+    columns: Optional[List[str]] = None
+    where_clause: Optional[str] = None
+    clean_up_temp_files: bool = True
+    max_rows: Optional[int] = None
+    hyper_batch_size: int = 100000  # Add this here with other defaults
+    max_memory_gb: float = 0.8  # Share of the available memory the extraction may use
+    slice_column: Optional[str] = None  # Column the chunks are sliced on (default: partition/cluster column)
+    slice_strategy: str = 'auto'  # 'range', 'hash' (both need slice_column) or 'auto'
+    stream_queue_size: int = 8  # Record batches read streams may get ahead of the writer
+    stage_chunks: bool = False  # Stage fetched chunks as Parquet before writing the output
+    autotune: bool = True  # Size chunks and concurrency from measured bytes per row and rows/sec
+    watermark_column: Optional[str] = None  # Incremental refresh: only extract rows with a newer value
+    incremental_mode: str = 'append'  # 'append' or 'upsert' (replace rows with the same merge_keys)
+    merge_keys: Optional[List[str]] = None  # Key columns for incremental_mode 'upsert'
+    hyper_write_mode: str = 'pantab'  # 'pantab', or Hyper loads the staged chunks itself: 'insert' or 'merge'
+
+    def __post_init__(self):
+        """Validate configuration parameters."""
+        if self.output_format not in ['hyper', 'parquet', 'csv']:
+            raise ValueError("output_format must be one of: hyper, parquet, csv")
+        if self.slice_strategy not in ['auto', 'range', 'hash']:
+            raise ValueError("slice_strategy must be one of: auto, range, hash")
+        if self.slice_strategy in ['range', 'hash'] and not self.slice_column:
+            raise ValueError(f"slice_strategy '{self.slice_strategy}' needs a slice_column")
+        if self.incremental_mode not in ['append', 'upsert']:
+            raise ValueError("incremental_mode must be one of: append, upsert")
+        if self.watermark_column and self.output_format != 'hyper':
+            raise ValueError("incremental refresh (watermark_column) needs output_format 'hyper'")
+        if self.incremental_mode == 'upsert' and not self.merge_keys:
+            raise ValueError("incremental_mode 'upsert' needs merge_keys")
+        if self.initial_chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if self.max_workers <= 0:
+            raise ValueError("max_workers must be positive")
+        if not 0 < self.max_memory_gb <= 1:
+            raise ValueError("max_memory_gb must be a share of the available memory, between 0 and 1")
+        if self.stream_queue_size <= 0:
+            raise ValueError("stream_queue_size must be positive")
+        if self.max_rows is not None and self.max_rows <= 0:
+            raise ValueError("max_rows must be positive if specified")
+        if self.hyper_write_mode not in ['pantab', 'insert', 'merge']:
+            raise ValueError("hyper_write_mode must be one of: pantab, insert, merge")
+        if self.hyper_write_mode != 'pantab':
+            if self.output_format != 'hyper' or not self.stage_chunks:
+                raise ValueError(f"hyper_write_mode '{self.hyper_write_mode}' needs output_format 'hyper' and stage_chunks")
+            if self.max_rows:
+                raise ValueError(f"hyper_write_mode '{self.hyper_write_mode}' loads every staged row, it can't apply max_rows")
+        self.output_path = str(Path(self.output_path).resolve())
+
+
+# BigQuery type -> Arrow type written to the output, and the value NULLs become (None keeps them NULL)
+BQ_ARROW_TYPES = {
+    'STRING': (pa.string(), ''),
+    'GEOGRAPHY': (pa.string(), ''),
+    'JSON': (pa.string(), ''),
+    'BYTES': (pa.binary(), b''),
+    'INTEGER': (pa.int64(), 0),
+    'INT64': (pa.int64(), 0),
+    'FLOAT': (pa.float64(), 0.0),
+    'FLOAT64': (pa.float64(), 0.0),
+    'NUMERIC': (pa.float64(), 0.0),
+    'BIGNUMERIC': (pa.float64(), 0.0),
+    'BOOLEAN': (pa.bool_(), None),
+    'BOOL': (pa.bool_(), None),
+    'DATE': (pa.date32(), None),
+    'DATETIME': (pa.timestamp('us'), None),
+    'TIMESTAMP': (pa.timestamp('us', tz='UTC'), None),
+    'TIME': (pa.time64('us'), None),
+}
+
+
+class ConversionPlan:
+    """Per-column conversions compiled once from a BigQuery schema, applied to every batch.
+
+    Each column is cast to its target type and, for strings and numbers, has its NULLs
+    filled, using Arrow compute kernels. RECORD and REPEATED columns become JSON text,
+    since Hyper has no nested types.
+    """
+
+    def __init__(self, schema: Sequence[Any]):
+        self.columns: Dict[str, Tuple[pa.DataType, Optional[pa.Scalar], bool]] = {}
+        for field in schema:
+            nested = field.mode == 'REPEATED' or field.field_type in ('RECORD', 'STRUCT')
+            target, fill = (pa.string(), '') if nested else BQ_ARROW_TYPES.get(field.field_type, (pa.string(), ''))
+            self.columns[field.name] = (target, None if fill is None else pa.scalar(fill, target), nested)
+        self._schemas: Dict[pa.Schema, pa.Schema] = {}
+
+    def output_schema(self, schema: pa.Schema) -> pa.Schema:
+        """Schema of converted batches; columns the plan doesn't know keep their type."""
+        if schema not in self._schemas:
+            self._schemas[schema] = pa.schema([
+                pa.field(field.name, self.columns[field.name][0]) if field.name in self.columns else field
+                for field in schema
+            ])
+        return self._schemas[schema]
+
+    def apply(self, batch):
+        """Convert a RecordBatch or Table; returns the same kind."""
+        schema = self.output_schema(batch.schema)
+        arrays = []
+        for field, column in zip(schema, batch.columns):
+            if field.name in self.columns:
+                target, fill, nested = self.columns[field.name]
+                if nested:
+                    column = pa.array(
+                        [None if value is None else json.dumps(value, default=str) for value in column.to_pylist()],
+                        type=pa.string()
+                    )
+                elif column.type != target:
+                    column = pc.cast(column, target, safe=False)
+                if fill is not None and column.null_count:
+                    column = pc.fill_null(column, fill)
+            arrays.append(column)
+        return type(batch).from_arrays(arrays, schema=schema)
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in 1MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pruning_column(table) -> Optional[str]:
+    """The partitioning or first clustering column of a BigQuery table, None if it has neither.
+
+    Filters on this column let BigQuery prune storage, so a slice only reads its own part of the table.
+    """
+    partitioning = table.time_partitioning or table.range_partitioning
+    if partitioning is not None and partitioning.field:
+        return partitioning.field
+    if table.clustering_fields:
+        return table.clustering_fields[0]
+    return None
+
+
+def range_filters(column: str, quantiles: List[str]) -> List[str]:
+    """Disjoint filters that cover every row once: ranges of column between its quantiles, and its NULLs.
+
+    quantiles are SQL literals, as APPROX_QUANTILES returns them through FORMAT('%T').
+    """
+    # The first and last quantiles are the min and max; leave the outer ranges open ended
+    boundaries = list(dict.fromkeys(quantiles[1:-1]))
+
+    filters = []
+    lower = None
+    for upper in boundaries:
+        filters.append(f"`{column}` < {upper}" if lower is None else f"`{column}` >= {lower} AND `{column}` < {upper}")
+        lower = upper
+    filters.append(f"`{column}` IS NOT NULL" if lower is None else f"`{column}` >= {lower}")
+    filters.append(f"`{column}` IS NULL")
+    return filters
+
+
+class ChunkManifest:
+    """Checkpoint manifest of a staged extract: its slices and every completed chunk.
+
+    Saved after each chunk, so a rerun of the same extract reuses the slice plan and
+    only fetches the chunks that are missing, failed or no longer match their checksum.
+    """
+
+    def __init__(self, path: str, source: Dict[str, Any]):
+        self.path = path
+        self.source = source
+        self.slices: Optional[List[str]] = None
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('source') == source:
+                self.slices = saved['slices']
+                self.chunks = saved['chunks']
+            else:
+                logger.warning(f"Ignoring checkpoint manifest {path}: it was written for a different extract")
+
+    def start(self, slices: List[str]):
+        self.slices = slices
+        self.chunks = {}
+        with self.lock:
+            self._save()
+
+    def completed(self, chunk_num: int, directory: str) -> Optional[Dict[str, Any]]:
+        """The entry of a completed chunk whose staged file is intact, else None."""
+        entry = self.chunks.get(str(chunk_num))
+        if entry is None or entry['file'] is None:
+            return entry
+        path = os.path.join(directory, entry['file'])
+        if not os.path.exists(path) or file_sha256(path) != entry['sha256']:
+            logger.warning(f"Staged file of chunk {chunk_num} is missing or changed, fetching it again")
+            return None
+        return entry
+
+    def record(self, chunk_num: int, file: Optional[str], rows: int, sha256: Optional[str]):
+        with self.lock:
+            self.chunks[str(chunk_num)] = {'file': file, 'rows': rows, 'sha256': sha256}
+            self._save()
+
+    def _save(self):
+        # Write then rename, so a crash never leaves a half-written manifest
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'source': self.source, 'slices': self.slices, 'chunks': self.chunks}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class WatermarkState:
+    """Watermark of the last successful incremental extract, saved next to its Hyper file."""
+
+    def __init__(self, path: str, column: str):
+        self.path = path
+        self.column = column
+        self.watermark: Optional[str] = None
+
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('column') == column:
+                self.watermark = saved['watermark']
+            else:
+                logger.warning(f"Ignoring watermark {path}: it was saved for column {saved.get('column')}")
+
+    def save(self, watermark: str, output: str, rows: int):
+        self.watermark = watermark
+        # Write then rename, so a crash never leaves a half-written watermark
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'column': self.column, 'watermark': watermark, 'output': output, 'rows': rows,
+                       'updated_at': datetime.now().isoformat(timespec='seconds')}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+class Autotuner:
+    """Chunk size and concurrency sized from measurements instead of fixed guesses.
+
+    Starts from an estimate of the bytes per row (the table's stored size) and replaces
+    it with what fetched chunks actually take in memory as Arrow. After every round of
+    fetches the concurrency moves one worker in whichever direction raised rows/sec,
+    capped so the chunks in flight fit the memory budget; it steps down whenever the
+    Arrow memory in use grows past the budget.
+    """
+
+    DEFAULT_BYTES_PER_ROW = 1024  # Only until the first chunk is measured
+    MIN_CHUNK_ROWS = 50_000
+    MAX_CHUNK_ROWS = 1_000_000
+    COPIES = 2  # A chunk is held as fetched and as converted while it is written
+
+    def __init__(self, memory_budget: int, max_workers: int, bytes_per_row: Optional[float] = None,
+                 adaptive: bool = True, min_round_seconds: float = 1.0):
+        self.memory_budget = memory_budget
+        self.max_workers = max_workers
+        self.estimated_bytes_per_row = bytes_per_row or self.DEFAULT_BYTES_PER_ROW
+        self.adaptive = adaptive
+        self.min_round_seconds = min_round_seconds
+        # Arrow's own count of live allocations; RSS keeps memory the allocator has cached
+        self.memory_limit = pa.total_allocated_bytes() + memory_budget
+        self.workers = max(1, max_workers // 2) if adaptive else max_workers
+        self.rows = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self._direction = 1
+        self._last_rate = None
+        self._round_rows = 0
+        self._round_chunks = 0
+        self._round_started = self.started
+
+    @property
+    def bytes_per_row(self) -> float:
+        return self.bytes / self.rows if self.rows else self.estimated_bytes_per_row
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def chunk_rows(self) -> int:
+        """Rows per chunk that let max_workers chunks fit the memory budget at once."""
+        rows = self.memory_budget / (self.max_workers * self.COPIES * max(self.bytes_per_row, 1))
+        return int(min(self.MAX_CHUNK_ROWS, max(self.MIN_CHUNK_ROWS, rows)))
+
+    def worker_limit(self) -> int:
+        """How many chunks of the measured average size fit the memory budget at once."""
+        # Empty chunks, or a table without rows, measure 0 bytes
+        chunk_bytes = self.bytes / self.chunks if self.chunks else self.chunk_rows() * self.bytes_per_row
+        return max(1, min(self.max_workers, int(self.memory_budget // (max(chunk_bytes, 1) * self.COPIES))))
+
+    def observe(self, rows: int, nbytes: int):
+        """Record a fetched chunk or batch; at the end of a round, move the concurrency."""
+        with self.lock:
+            self.rows += rows
+            self.bytes += nbytes
+            self.chunks += 1
+            self._round_rows += rows
+            self._round_chunks += 1
+
+            elapsed = time.perf_counter() - self._round_started
+            if not self.adaptive or self._round_chunks < self.workers or elapsed < self.min_round_seconds:
+                return
+            rate = self._round_rows / elapsed
+            workers = self.workers
+            if pa.total_allocated_bytes() > self.memory_limit:
+                self._direction = -1
+                workers -= 1
+            elif self._last_rate is None or rate > self._last_rate * 1.1:
+                workers += self._direction
+            elif rate < self._last_rate * 0.9:
+                # The last step made it slower: go back the other way
+                self._direction = -self._direction
+                workers += self._direction
+            self.workers = max(1, min(workers, self.worker_limit()))
+
+            self._last_rate = rate
+            self._round_rows = 0
+            self._round_chunks = 0
+            self._round_started = time.perf_counter()
+
+    def summary(self) -> str:
+        return (f"{self.bytes_per_row:,.0f} bytes/row in memory, {self.rows_per_sec:,.0f} rows/sec, "
+                f"{self.workers} of {self.max_workers} workers")
+
+
+class BigQueryExtractor:
+    """Extracts a table from an ExtractSource, BigQuery by default, to one Hyper, Parquet or CSV file."""
+
+    def __init__(self, config: BigQueryConfig, source: Optional[ExtractSource] = None):
+        self.config = config
+        self.chunk_size = config.chunk_size or config.initial_chunk_size
+
+        os.makedirs(config.output_path, exist_ok=True)
+        self.source = source or BigQuerySource(config.project_id, config.source_project, config.dataset_id,
+                                               config.table_id, config.max_bytes_billed)
+
+        # Fetch schema information and compile it into the per-column conversions
+        self.table = self.source.get_table()
+        self.schema = self.table.schema
+        self.conversion_plan = ConversionPlan(self.schema)
+
+        # Chunk size from the table's stored bytes per row until fetched chunks are measured
+        self.autotuner = self._create_autotuner(config.max_workers)
+        if config.autotune and config.chunk_size is None:
+            self.chunk_size = self.autotuner.chunk_rows()
+        logger.info(f"Chunk size: {self.chunk_size:,} rows")
+
+        self.delta_filter = None  # Rows after the watermark, in incremental mode
+        self.output_filename = None  # Fixed output name instead of a timestamped one
+        self.total_rows = 0
+        self.processed_chunks = 0
+        self.failed_chunks = []
+        self.stream_total_records = None
+        self.start_time = time.time()
+        self.last_progress = 0.0
+
+    def _create_autotuner(self, max_workers: int) -> Autotuner:
+        """Autotuner for up to max_workers concurrent fetches within the configured memory share."""
+        memory_budget = int(psutil.virtual_memory().available * self.config.max_memory_gb)
+        # BigQuery's stored size is close to the Arrow size, and known before anything is fetched
+        bytes_per_row = self.table.num_bytes / self.table.num_rows if self.table.num_rows and self.table.num_bytes else None
+        autotuner = Autotuner(memory_budget, max_workers, bytes_per_row, adaptive=self.config.autotune)
+        logger.info(f"Memory budget {memory_budget / 1024 ** 3:.1f}GB, "
+                    f"estimated {autotuner.bytes_per_row:,.0f} bytes/row before measuring")
+        return autotuner
+
+    def _columns(self) -> List[str]:
+        return self.config.columns or [field.name for field in self.schema]
+
+    def _where_clause(self) -> Optional[str]:
+        """The configured filter, narrowed to the rows after the watermark in incremental mode."""
+        filters = [f for f in (self.config.where_clause, self.delta_filter) if f]
+        if len(filters) < 2:
+            return next(iter(filters), None)
+        return ' AND '.join(f"({f})" for f in filters)
+
+    def _count_records(self) -> int:
+        total = self.source.count_rows(self._where_clause())
+        logger.info(f"Total records to process: {total:,}")
+        return total
+
+    def _slice_column(self) -> Tuple[Optional[str], str]:
+        """Pick the column and strategy used to slice the table into chunks, (None, 'auto') if there is none.
+
+        Range slices on the partitioning or first clustering column let BigQuery prune
+        storage, so each chunk only reads its own part of the table. A range or hash slice
+        on any other column scans the selected columns of the whole table, so bytes
+        billed grow with the number of slices; that is only done on a slice_column the
+        caller names.
+        """
+        strategy = self.config.slice_strategy
+        column = self.config.slice_column or pruning_column(self.table)
+
+        if strategy == 'auto' and column:
+            strategy = 'range'
+        return column, strategy
+
+    def _plan_slices(self, total_records: int) -> List[str]:
+        """Build disjoint filters that together cover every row exactly once."""
+        num_slices = max(1, -(-total_records // self.chunk_size))
+        column, strategy = self._slice_column()
+        self.slice_by = (column, strategy)
+
+        if strategy == 'hash':
+            # Every hash slice scans the whole table, so keep them as large as memory allows
+            slices = [
+                f"ABS(MOD(FARM_FINGERPRINT(TO_JSON_STRING(`{column}`)), {num_slices})) = {i}"
+                for i in range(num_slices)
+            ]
+            logger.info(f"Slicing into {num_slices} chunks by hash of {column}; each one scans the "
+                        f"selected columns of the whole table")
+            return slices
+
+        slices = self._range_slices(column, num_slices, self._where_clause())
+        logger.info(f"Slicing into {len(slices)} chunks by range of {column}")
+        return slices
+
+    def _range_slices(self, column: str, parts: int, where: Optional[str]) -> List[str]:
+        """Disjoint ranges of column between its quantiles within where, and its NULLs."""
+        return range_filters(column, self.source.quantiles(column, parts, where))
+
+    def _slice_where(self, slice_filter: str) -> str:
+        """Filter of one slice of the table, within the configured filter."""
+        if self._where_clause():
+            return f"({slice_filter}) AND ({self._where_clause()})"
+        return slice_filter
+
+    def _save_chunk(self, table: pa.Table, chunk_num: int) -> str:
+        """Stage a fetched chunk as Parquet, as fetched; types are coerced when writing the output."""
+        # The same name on every run, so a rerun finds the chunks it already has
+        filename = f"{self.config.table_id}_chunk_{chunk_num:05d}.parquet"
+        full_path = f"{self.config.output_path}/{filename}"
+
+        # Written under a temporary name first, so a crash never leaves a partial chunk
+        pq.write_table(table, f"{full_path}.tmp", compression='snappy')
+        os.replace(f"{full_path}.tmp", full_path)
+
+        logger.debug(f"Saved chunk {chunk_num} to {full_path}")
+        return filename
+
+    def _log_progress(self, message: str):
+        """Log progress at most every PROGRESS_SECONDS."""
+        now = time.time()
+        if now - self.last_progress < PROGRESS_SECONDS:
+            return
+        self.last_progress = now
+        elapsed_time = now - self.start_time
+        rows_per_second = self.total_rows / elapsed_time if elapsed_time > 0 else 0
+        memory_usage_mb = psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+        logger.info(f"{message}, {rows_per_second:,.0f} rows/sec, {memory_usage_mb:,.0f}MB, {elapsed_time:.0f}s")
+
+    def _update_progress(self, total_chunks: int):
+        self._log_progress(f"{self.processed_chunks}/{total_chunks} chunks, {self.total_rows:,} rows")
+
+    def _update_progress_streaming(self, total_rows: int):
+        if self.stream_total_records is None:
+            self.stream_total_records = self._count_records()
+        total_records = self.stream_total_records
+        progress = total_rows / total_records * 100 if total_records > 0 else 0
+        self._log_progress(f"{progress:.1f}%, {total_rows:,} of {total_records:,} rows")
+
+    def _fetch_chunk(self, slice_filter: str, chunk_num: int) -> Optional[pa.Table]:
+        """Fetch a single chunk as an Arrow table with retry logic and exponential backoff."""
+        max_retries = 3
+
+        for attempt in range(max_retries):
+            try:
+                if attempt > 0:
+                    # A slice is a fixed set of rows, so a retry re-runs the same query
+                    logger.info(f"Retrying chunk {chunk_num} (Attempt {attempt + 1}/{max_retries})")
+
+                with stage_timer.timed('fetch'):
+                    table = self.source.fetch(self._columns(), self._slice_where(slice_filter))
+                self.autotuner.observe(table.num_rows, table.nbytes)
+                logger.info(f"Fetched chunk {chunk_num} ({table.num_rows:,} rows)")
+                return table
+
+            except Exception as e:
+                logger.error(f"Error processing chunk {chunk_num}: {str(e)}")
+
+                if attempt == max_retries - 1:
+                    logger.error(f"Max retries reached for chunk {chunk_num}. Marking as failed.")
+                    self.failed_chunks.append(chunk_num)
+                    return None
+
+                backoff_time = min(2 ** attempt, 30)
+                logger.info(f"Backing off for {backoff_time} seconds before retrying...")
+                time.sleep(backoff_time)
+
+        return None
+
+    def _fetch_and_save_chunk(self, slice_filter: str, chunk_num: int, manifest: ChunkManifest) -> Optional[str]:
+        """Fetch a single chunk, stage it as Parquet and record it in the checkpoint manifest."""
+        table = self._fetch_chunk(slice_filter, chunk_num)
+        if table is None:
+            return None
+        if table.num_rows == 0:
+            logger.warning(f"Chunk {chunk_num} is empty. Skipping.")
+            manifest.record(chunk_num, None, 0, None)
+            return None
+
+        self.total_rows += table.num_rows
+        if self.config.hyper_write_mode != 'pantab':
+            # Hyper reads the staged file as it is, so it is staged with the output types
+            table = self._process_arrow_batch(table)
+        with stage_timer.timed('stage'):
+            saved_file = self._save_chunk(table, chunk_num)
+            manifest.record(chunk_num, saved_file, table.num_rows,
+                            file_sha256(f"{self.config.output_path}/{saved_file}"))
+        logger.info(f"Successfully processed and saved chunk {chunk_num}")
+        return saved_file
+
+    def _split_slice(self, slice_filter: str, parts: int) -> List[str]:
+        """Split a range slice into up to parts disjoint sub-ranges between its own quantiles.
+
+        The quantiles and every sub-range only read the slice's part of the table. Hash
+        slices are not split: each part would scan the whole table again.
+        """
+        column, strategy = self.slice_by
+        if strategy != 'range' or slice_filter == f"`{column}` IS NULL":
+            return [slice_filter]
+        return [f"({slice_filter}) AND {part}"
+                for part in self._range_slices(column, parts, self._slice_where(slice_filter))[:-1]]
+
+    def _fetch_ordered(self, slices: List[str]) -> Iterator[pa.RecordBatch]:
+        """Record batches of every slice, in slice order, fetched concurrently.
+
+        The next chunk is only submitted once the oldest one has been handed to the writer,
+        and the autotuner decides how many chunks are in flight, so the chunks held in memory
+        stay within its budget. Once the first chunks are measured, slices that turn out
+        much larger than the tuned chunk size are split before they are fetched.
+        """
+        upcoming = deque(slices)
+        chunk_nums = itertools.count()
+        pending = deque()
+        resliced = not self.config.autotune or self.config.chunk_size is not None
+        # Parts each remaining planned slice is split into when it is reached
+        parts = 1
+        planned = set(slices)
+
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            def submit_next():
+                nonlocal resliced, parts
+                if not resliced and self.autotuner.chunks:
+                    rows_per_slice = self.autotuner.rows / self.autotuner.chunks
+                    parts = -(-int(rows_per_slice) // self.autotuner.chunk_rows())
+                    if parts >= 2:
+                        logger.info(f"Chunks average {rows_per_slice:,.0f} rows, splitting each of the "
+                                    f"remaining {len(upcoming)} slices in up to {parts}")
+                    resliced = True
+                if upcoming:
+                    slice_filter = upcoming.popleft()
+                    if parts >= 2 and slice_filter in planned:
+                        upcoming.extendleft(reversed(self._split_slice(slice_filter, parts)))
+                        slice_filter = upcoming.popleft()
+                    pending.append(executor.submit(self._fetch_chunk, slice_filter, next(chunk_nums)))
+
+            def fill_window():
+                while upcoming and len(pending) < self.autotuner.workers:
+                    submit_next()
+
+            fill_window()
+            try:
+                while pending:
+                    table = pending.popleft().result()
+                    self.processed_chunks += 1
+                    fill_window()
+                    if table is not None:
+                        yield from table.to_batches()
+            finally:
+                # Stopped early (max_rows or an error): don't fetch what won't be written
+                for future in pending:
+                    future.cancel()
+        logger.info(f"Autotuner: {self.autotuner.summary()}")
+
+    def _get_optimal_stream_config(self) -> Dict[str, Any]:
+        """Read session size; the autotuner then decides how many of its streams are read at once.
+
+        Each stream only holds the page it is reading and the queue holds stream_queue_size
+        batches, so memory doesn't grow with the session's stream count.
+        """
+        stream_count = max(1, min(os.cpu_count() * 2, 16))
+        self.autotuner = self._create_autotuner(stream_count)
+        logger.info(f"Requesting up to {stream_count} streams, reading {self.autotuner.workers} at first")
+        return {
+            'stream_count': stream_count,
+            'memory_limit': self.autotuner.memory_budget,
+        }
+
+    def _final_filename(self) -> str:
+        if self.output_filename:
+            return self.output_filename
+        return f"{self.config.table_id}_complete_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{self.config.output_format}"
+
+    def _write_output(self, batches: Iterable[pa.RecordBatch], output_path: str) -> int:
+        """Write record batches to output_path through one writer, in the configured format."""
+        if self.config.output_format == 'hyper':
+            return self._write_hyper_batches(batches, output_path)
+
+        writer = None
+        try:
+            for batch in self._limit_batches(batches):
+                batch = self._process_arrow_batch(batch)
+                with stage_timer.timed('write'):
+                    if writer is None:
+                        if self.config.output_format == 'parquet':
+                            writer = pq.ParquetWriter(output_path, batch.schema, compression='snappy')
+                        else:
+                            writer = pacsv.CSVWriter(output_path, batch.schema,
+                                                     write_options=pacsv.WriteOptions(quoting_style='needed'))
+                    writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                with stage_timer.timed('write'):
+                    writer.close()
+        return self.total_rows
+
+    def _staged_batches(self, saved_files: List[str]) -> Iterator[pa.RecordBatch]:
+        for file in saved_files:
+            yield from stage_timer.timed_iter('stage', pq.ParquetFile(f"{self.config.output_path}/{file}").iter_batches())
+
+    def _merge_to_final_format(self, saved_files: List[str]) -> str:
+        """Write the staged chunks to the final output format in one pass."""
+        final_filename = self._final_filename()
+
+        try:
+            logger.info(f"Writing {len(saved_files)} staged chunks to {self.config.output_format}...")
+            if self.config.hyper_write_mode != 'pantab':
+                self._load_staged_hyper(saved_files, f"{self.config.output_path}/{final_filename}")
+            else:
+                self._write_output(self._staged_batches(saved_files), f"{self.config.output_path}/{final_filename}")
+            logger.info(f"Completed {self.config.output_format} file creation")
+
+            if self.config.clean_up_temp_files:
+                for file in saved_files:
+                    try:
+                        os.remove(f"{self.config.output_path}/{file}")
+                        logger.debug(f"Removed temporary file: {file}")
+                    except Exception as e:
+                        logger.warning(f"Failed to remove temporary file {file}: {str(e)}")
+
+            return final_filename
+
+        except Exception as e:
+            logger.error(f"Error merging files: {str(e)}")
+            raise
+
+    def _load_staged_hyper(self, saved_files: List[str], output_path: str):
+        """Load the staged chunks into Hyper with the HyperWriter of the v2.5 notebook.
+
+        Hyper reads the Parquet files itself: 'insert' in one INSERT ... SELECT, 'merge'
+        into one part database per worker in parallel, merged in chunk order.
+        """
+        from hyper_writer import HyperWriter
+
+        files = [Path(self.config.output_path) / file for file in saved_files]
+        with stage_timer.timed('write'), HyperWriter(output_path, table=self.config.table_id) as writer:
+            if self.config.hyper_write_mode == 'merge':
+                writer.insert_files_parallel(files, self.config.max_workers)
+            else:
+                writer.insert_files(files)
+            logger.info(f"Hyper loaded {writer.row_count():,} rows")
+
+    def _stream_chunks_to_final_format(self, slices: List[str]) -> str:
+        """Write fetched chunks straight to the final output, in order, without staging."""
+        final_filename = self._final_filename()
+        self._write_output(self._fetch_ordered(slices), f"{self.config.output_path}/{final_filename}")
+        return final_filename
+
+    def _extract_staged(self, total_records: int) -> Optional[str]:
+        """Stage chunks as Parquet with a checkpoint manifest, resuming a previous run if there is one."""
+        manifest = ChunkManifest(
+            f"{self.config.output_path}/{self.config.table_id}_manifest.json",
+            source={
+                'table': f"{self.config.source_project}.{self.config.dataset_id}.{self.config.table_id}",
+                'columns': self.config.columns,
+                'where_clause': self._where_clause(),
+                'hyper_write_mode': self.config.hyper_write_mode,
+            }
+        )
+        if manifest.slices is None:
+            # Disjoint slices, so parallel workers never read the same rows twice
+            manifest.start(self._plan_slices(total_records))
+        slices = manifest.slices
+
+        saved_files = {}
+        remaining = []
+        for chunk_num in range(len(slices)):
+            entry = manifest.completed(chunk_num, self.config.output_path)
+            if entry is None:
+                remaining.append(chunk_num)
+                continue
+            if entry['file']:
+                saved_files[chunk_num] = entry['file']
+            self.total_rows += entry['rows']
+            self.processed_chunks += 1
+        if self.processed_chunks:
+            logger.info(f"Resuming from checkpoint: {self.processed_chunks} of {len(slices)} chunks "
+                        f"({self.total_rows:,} rows) already staged")
+
+        # The slices are fixed by the manifest, so only the number of chunks in flight is tuned
+        remaining = deque(remaining)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            while remaining or futures:
+                while remaining and len(futures) < self.autotuner.workers:
+                    chunk_num = remaining.popleft()
+                    futures[executor.submit(self._fetch_and_save_chunk, slices[chunk_num], chunk_num, manifest)] = chunk_num
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_num = futures.pop(future)
+                    try:
+                        result = future.result()
+                        if result:
+                            saved_files[chunk_num] = result
+                        self.processed_chunks += 1
+                        self._update_progress(len(slices))
+                    except Exception as e:
+                        logger.error(f"Error in chunk processing: {e}")
+                        self.failed_chunks.append(chunk_num)
+        logger.info(f"Autotuner: {self.autotuner.summary()}")
+        gc.collect()
+
+        if self.failed_chunks:
+            logger.error(f"{len(self.failed_chunks)} chunks failed: {sorted(self.failed_chunks)}. "
+                         f"Staged chunks and {manifest.path} are kept; rerun to fetch only those.")
+            return None
+        if not saved_files:
+            logger.warning("No data was successfully extracted.")
+            return None
+
+        # Chunk order, not completion order
+        final_path = self._merge_to_final_format([saved_files[n] for n in sorted(saved_files)])
+        if self.config.clean_up_temp_files:
+            manifest.remove()
+        return final_path
+
+    def _extract(self) -> Tuple[int, Optional[str]]:
+        """Extract the selected rows into one output file; returns (rows, file name or None)."""
+        if self._slice_column()[0] is None:
+            # Slices of a table without a key column would each scan all of it
+            if self.config.stage_chunks:
+                raise ValueError(f"{self.config.table_id} has no partitioning or clustering column to slice "
+                                 f"on: set slice_column to a key column (every slice then scans the selected "
+                                 f"columns of the whole table), or turn stage_chunks off to read it once "
+                                 f"through a read session")
+            logger.info(f"{self.config.table_id} has no partitioning or clustering column, reading it once "
+                        f"through a read session instead of sliced queries")
+            return self.extract_streams()
+
+        total_records = self._count_records()
+        if total_records == 0:
+            logger.warning("No records found to extract")
+            return 0, None
+
+        self.stream_total_records = total_records
+
+        if not self.config.stage_chunks:
+            # Disjoint slices, so parallel workers never read the same rows twice
+            final_path = self._stream_chunks_to_final_format(self._plan_slices(total_records))
+            if self.failed_chunks:
+                # The file lacks the rows of the failed slices, so it is not an output
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{self.config.output_path}/{final_path}")
+                logger.error(f"{len(self.failed_chunks)} chunks failed: {sorted(self.failed_chunks)}. "
+                             f"Removed the incomplete {final_path}; set stage_chunks=True to resume "
+                             f"a failed extract instead of starting over.")
+                return self.total_rows, None
+        else:
+            final_path = self._extract_staged(total_records)
+            if final_path is None:
+                return self.total_rows, None
+
+        logger.info(f"Successfully created final file: {final_path}")
+        return self.total_rows, final_path
+
+    def _max_watermark(self) -> Optional[str]:
+        """Current maximum of the watermark column as a SQL literal, None if it has no values."""
+        return self.source.max_value(self.config.watermark_column, self.config.where_clause)
+
+    def _merge_delta(self, delta_path: str, target_path: str) -> int:
+        """Append or upsert the table of a delta Hyper file into the target's in one transaction.
+
+        Returns the number of target rows the upsert replaced.
+        """
+        from tableauhyperapi import HyperProcess, Connection, Telemetry, TableName, escape_name
+
+        with HyperProcess(telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU) as hyper:
+            with Connection(hyper.endpoint) as connection:
+                # Both attached under an alias, so every table name is fully qualified
+                connection.catalog.attach_database(target_path, alias='target')
+                connection.catalog.attach_database(delta_path, alias='delta')
+                target = TableName('target', 'public', self.config.table_id)
+                delta = TableName('delta', 'public', self.config.table_id)
+
+                replaced = 0
+                rows = f"SELECT * FROM {delta}"
+                connection.execute_command("BEGIN TRANSACTION")
+                try:
+                    if self.config.incremental_mode == 'upsert':
+                        keys = ' AND '.join(f"{delta}.{escape_name(key)} = {target}.{escape_name(key)}"
+                                            for key in self.config.merge_keys)
+                        replaced = connection.execute_command(
+                            f"DELETE FROM {target} WHERE EXISTS (SELECT 1 FROM {delta} WHERE {keys})"
+                        )
+                        # A key updated more than once since the last run has a row per version, keep the newest
+                        definition = connection.catalog.get_table_definition(delta)
+                        columns = ', '.join(str(column.name) for column in definition.columns)
+                        partition = ', '.join(escape_name(key) for key in self.config.merge_keys)
+                        rows = (f"SELECT {columns} FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} "
+                                f"ORDER BY {escape_name(self.config.watermark_column)} DESC) AS \"merge_version\" "
+                                f"FROM {delta}) AS versions WHERE \"merge_version\" = 1")
+                    connection.execute_command(f"INSERT INTO {target} {rows}")
+                    connection.execute_command("COMMIT")
+                except Exception:
+                    connection.execute_command("ROLLBACK")
+                    raise
+                finally:
+                    connection.catalog.detach_all_databases()
+        return replaced
+
+    def _extract_incremental(self) -> Tuple[int, Optional[str]]:
+        """Extract the rows after the saved watermark and append or upsert them into the Hyper file.
+
+        The first run, or a run whose Hyper file is gone, extracts everything. The watermark
+        only moves once the new rows are in the file, so a failed run is simply repeated.
+        """
+        column = self.config.watermark_column
+        target = f"{self.config.table_id}.hyper"
+        target_path = f"{self.config.output_path}/{target}"
+        state = WatermarkState(f"{self.config.output_path}/{self.config.table_id}_watermark.json", column)
+
+        # Taken before extracting: rows that arrive meanwhile are left for the next run
+        high = self._max_watermark()
+        if high is None:
+            logger.warning(f"{column} has no values, nothing to extract")
+            return 0, None
+
+        refresh = state.watermark is not None and os.path.exists(target_path)
+        if refresh:
+            logger.info(f"Incremental refresh of {target}: {column} after {state.watermark} up to {high}")
+            self.delta_filter = f"`{column}` > {state.watermark} AND `{column}` <= {high}"
+            self.output_filename = f"{self.config.table_id}_delta.hyper"
+        else:
+            logger.info(f"No watermark for {target} yet, extracting everything up to {high}")
+            self.delta_filter = f"`{column}` <= {high}"
+            self.output_filename = target
+
+        rows, output = self._extract()
+        if self.failed_chunks or (output is None and rows):
+            raise RuntimeError(f"{len(self.failed_chunks)} chunks failed; the watermark stays at "
+                               f"{state.watermark}, so the next run extracts the same rows again")
+        if output is None:
+            logger.info(f"No rows after {state.watermark}, {target} is up to date")
+            return 0, target if refresh else None
+
+        if refresh:
+            delta_path = f"{self.config.output_path}/{output}"
+            replaced = self._merge_delta(delta_path, target_path)
+            os.remove(delta_path)
+            logger.info(f"{'Upserted' if self.config.incremental_mode == 'upsert' else 'Appended'} "
+                        f"{rows:,} rows into {target} ({replaced:,} replaced)")
+
+        state.save(high, target, rows)
+        return rows, target
+
+    def extract_data(self) -> Tuple[int, Optional[str]]:
+        """Extract the table through sliced queries; returns (rows, output file name or None)."""
+        try:
+            if self.config.watermark_column:
+                return self._extract_incremental()
+            return self._extract()
+        except Exception as e:
+            logger.error(f"Error during extraction: {str(e)}")
+            raise
+
+    def extract_streams(self) -> Tuple[int, Optional[str]]:
+        """Extract the table through the streams of one read session; returns (rows, output file name or None).
+
+        Rows arrive in no particular order, and there is no staging or checkpoint; max_rows
+        stops reading once it is reached. The table is read once, so this is also how
+        extract_data reads a table that has no column to slice on.
+        """
+        total_records = self._count_records()
+        if total_records == 0:
+            logger.warning("No records found to extract")
+            return 0, None
+        self.stream_total_records = total_records
+
+        config = self._get_optimal_stream_config()
+        streams = self._create_read_session(config['stream_count'])
+        final_filename = self._final_filename()
+        with contextlib.closing(self._read_arrow_batches(streams)) as batches:
+            self._write_output(batches, f"{self.config.output_path}/{final_filename}")
+        logger.info(f"Successfully created final file: {final_filename} ({self.total_rows:,} rows)")
+        return self.total_rows, final_filename
+
+    def _process_arrow_batch(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        """Convert a record batch to the output types with the schema's conversion plan."""
+        with stage_timer.timed('convert'):
+            return self.conversion_plan.apply(batch)
+
+    def _read_arrow_batches(self, streams: List[str]) -> Iterator[pa.RecordBatch]:
+        """Record batches of every stream of a read session, read concurrently.
+
+        One reader thread per stream puts batches on a bounded queue that a single
+        consumer drains, so at most stream_queue_size batches wait in memory however
+        fast the streams are. The autotuner sets how many streams are read at once from
+        the measured rows/sec. Closing the generator (e.g. at max_rows) stops the readers.
+        """
+        batches = queue.Queue(maxsize=self.config.stream_queue_size)
+        stop = threading.Event()
+        stream_done = object()
+        # Streams being read; the autotuner sets how many may be
+        slots = threading.Condition()
+        active = 0
+
+        def put(item) -> bool:
+            # Time out now and then so readers notice when the consumer has stopped
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_stream(stream: str):
+            nonlocal active
+            try:
+                with slots:
+                    while active >= self.autotuner.workers and not stop.is_set():
+                        slots.wait(timeout=0.1)
+                    if stop.is_set():
+                        return
+                    active += 1
+                try:
+                    for batch in stage_timer.timed_iter('fetch', self.source.read_stream(stream)):
+                        self.autotuner.observe(batch.num_rows, batch.nbytes)
+                        if not put(batch):
+                            return
+                finally:
+                    with slots:
+                        active -= 1
+                        slots.notify_all()
+            except Exception as e:
+                put(e)
+            finally:
+                put(stream_done)
+
+        if not streams:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(streams), thread_name_prefix='bq-stream') as executor:
+            for stream in streams:
+                executor.submit(read_stream, stream)
+            try:
+                remaining = len(streams)
+                while remaining:
+                    item = batches.get()
+                    if item is stream_done:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+                logger.info(f"Autotuner: {self.autotuner.summary()}")
+            finally:
+                stop.set()
+
+    def _limit_batches(self, batches: Iterable[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+        """Apply max_rows across all streams, updating progress as batches pass."""
+        total_rows = 0
+        self.total_rows = 0
+        for batch in batches:
+            if self.config.max_rows:
+                rows_remaining = self.config.max_rows - total_rows
+                if rows_remaining <= 0:
+                    break
+                if batch.num_rows > rows_remaining:
+                    batch = batch.slice(0, rows_remaining)
+
+            total_rows += batch.num_rows
+            self.total_rows = total_rows
+            yield batch
+            self._update_progress_streaming(total_rows)
+
+    def _write_hyper_batches(self, batches: Iterable[pa.RecordBatch], output_path: str) -> int:
+        """Write record batches to one Hyper table through a single inserter.
+
+        pantab reads the stream batch by batch, so only the batch being inserted is held in memory.
+        """
+        import pantab
+
+        processed = (self._process_arrow_batch(batch) for batch in self._limit_batches(batches))
+        first = next(processed, None)
+        if first is None:
+            logger.warning("No rows to write")
+            return 0
+
+        # pantab ends the insert quietly if the reader raises, so keep the error and re-raise it
+        errors = []
+        # pantab pulls the batches itself: the write is its time less the time spent waiting for them
+        waited = 0.0
+
+        def checked(batches):
+            nonlocal waited
+            try:
+                while True:
+                    started = time.perf_counter()
+                    batch = next(batches, None)
+                    waited += time.perf_counter() - started
+                    if batch is None:
+                        return
+                    yield batch
+            except Exception as e:
+                errors.append(e)
+
+        reader = pa.RecordBatchReader.from_batches(first.schema, checked(itertools.chain([first], processed)))
+        started = time.perf_counter()
+        pantab.frame_to_hyper(reader, output_path, table=self.config.table_id, table_mode='w')
+        stage_timer.add('write', time.perf_counter() - started - waited)
+        if errors:
+            raise errors[0]
+        return self.total_rows
+
+    def _create_read_session(self, stream_count: int) -> List[str]:
+        streams = self.source.read_session(self._columns(), self._where_clause(), stream_count)
+        logger.info(f"Created read session with {len(streams)} streams")
+        return streams
+
+
+def extract_bigquery_data(config: BigQueryConfig, source: Optional[ExtractSource] = None) -> Tuple[int, Optional[str]]:
+    """Extract the configured table, from BigQuery unless another source is given."""
+    return BigQueryExtractor(config, source).extract_data()
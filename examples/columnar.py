@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+# Positions of the 32 hex digits within the 36 character UUID string
+_UUID_HEX_POSITIONS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+
+def random_uuids(n: int, rng=np.random) -> np.ndarray:
+    """Random version 4 UUID strings generated in bulk from random bytes
+
+    rng defaults to the global numpy random state, so the IDs follow the generator's seed.
+    """
+    raw = np.frombuffer(rng.bytes(n * 16), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+    # Two hex digits per byte through a lookup table, dashes in between
+    text = np.full((n, 36), ord('-'), dtype=np.uint8)
+    text[:, _UUID_HEX_POSITIONS[0::2]] = _HEX_DIGITS[raw >> 4]
+    text[:, _UUID_HEX_POSITIONS[1::2]] = _HEX_DIGITS[raw & 0x0F]
+    return text.view('S36').ravel().astype('U36')
+
+
+def choice_categorical(labels, size: int, p=None, rng=np.random) -> pd.Categorical:
+    """Like rng.choice(labels, size, p=p), drawing the same rows, but as codes into labels"""
+    return pd.Categorical.from_codes(rng.choice(len(labels), size=size, p=p), categories=labels)
+
+
+def code_labels(codes: np.ndarray, fmt: str) -> pd.Categorical:
+    """Labels for integer codes as a Categorical, one format call per possible code"""
+    low, high = (codes.min(), codes.max()) if len(codes) else (0, -1)
+    table = [fmt.format(code) for code in range(low, high + 1)]
+    return pd.Categorical.from_codes(codes - low, categories=table)
+
+
+def week_starts(days: np.ndarray) -> np.ndarray:
+    """Monday of the week of each datetime64[D] value"""
+    # 1970-01-01 was a Thursday
+    weekdays = (days.astype(np.int64) + 3) % 7
+    return days - weekdays.astype('timedelta64[D]')
+
+
+def month_starts(days: np.ndarray) -> np.ndarray:
+    """First day of the month of each datetime64[D] value"""
+    return days.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def format_datetimes(values: np.ndarray, date_format: str) -> pd.Categorical:
+    """Format a datetime64 array by formatting each distinct value only once
+
+    The result is a Categorical ordered by time, so min() and max() are the earliest and latest.
+    """
+    unique_values, inverse = np.unique(values, return_inverse=True)
+    index = pd.DatetimeIndex(unique_values)
+    # np.unique sorts NaT last, so the codes of the other values stay the same without it
+    missing = index.isna()
+    codes = np.where(missing[inverse], -1, inverse)
+    return pd.Categorical.from_codes(codes, categories=index[~missing].strftime(date_format), ordered=True)
+
+
+def widen_float32(values: np.ndarray) -> np.ndarray:
+    """float32 values as float64, rounded to the 7 significant digits float32 holds
+
+    A plain cast turns 12.53 into 12.529999732971191, this keeps it 12.53.
+    """
+    values = values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        decimals = 7 - np.ceil(np.log10(np.abs(values)))
+    scale = 10.0 ** np.clip(np.nan_to_num(decimals, nan=0, posinf=0, neginf=0), 0, 15)
+    return np.round(values * scale) / scale
+
@@ -4,16 +4,45 @@ from datetime import datetime, timedelta
 import random
 from typing import List, Dict, Any
 
+import importlib.util
+
+import stage_timer
+from columnar import choice_categorical
+from export import write_frame
+from scenarios import apply_scenarios
+
 # Configuration Parameters - Modify these to adjust data characteristics
 NUM_ROWS = 150000
 OUTLIER_FRACTION = 0.02
 OUTLIER_MAGNITUDE = 3.0
 RANDOM_SEED = 42
 
+# By default all NUM_ROWS rows are built in one DataFrame before they are written,
+# so memory grows with NUM_ROWS; for large NUM_ROWS use sharded mode.
+#
+# Sharded mode - set SHARD_ROWS to generate NUM_ROWS as independent seeded shards
+# in parallel, each written straight to its own part files under SHARD_OUTPUT_DIR
+SHARD_ROWS = None
+SHARD_WORKERS = None  # defaults to the number of cores
+SHARD_FORMATS = ('parquet',)  # any of 'parquet', 'hyper', 'csv'
+SHARD_OUTPUT_DIR = 'basel_iii_capital_adequacy_parts'
+SHARD_SINGLE_FILE = False  # stream the shards, in order, into one file per format instead
+
 # Set random seeds for reproducibility
 np.random.seed(RANDOM_SEED)
 random.seed(RANDOM_SEED)
 
+# Compact output types - dimensions are generated as categoricals, ratios are
+# float32 (7 significant digits), money amounts stay float64
+COLUMN_DTYPES = {
+    'CET1_Ratio': 'float32',
+    'Total_Capital_Ratio': 'float32',
+    'Leverage_Ratio': 'float32',
+    'RWA_Growth': 'float32',
+    'NPL_Ratio': 'float32',
+    'LCR_Ratio': 'float32'
+}
+
 # Banking-specific configuration for realistic data generation
 SCENARIO_CONFIG = {
     'enable_performance_spike': True,
@@ -58,86 +87,95 @@ def generate_credit_risk_categories() -> List[str]:
         'Sub-standard', 'Doubtful', 'Loss Category'
     ]
 
+def date_weights(total_days: int) -> np.ndarray:
+    """Weighted distribution over days favoring recent dates (60% in last 6 months)"""
+    weights = np.linspace(0.1, 2.0, total_days)
+    return weights / weights.sum()
+
+def recent_date_threshold(start: datetime, end: datetime, quantile: float = 0.8) -> datetime:
+    """Date quantile of the weighted distribution - the same for every shard, unlike a sample quantile"""
+    cdf = np.cumsum(date_weights((end - start).days))
+    return start + timedelta(days=int(np.searchsorted(cdf, quantile)))
+
 def generate_date_series(start: datetime, end: datetime, size: int) -> pd.Series:
     """Generate date series with realistic distribution weighted toward recent dates"""
     total_days = (end - start).days
     
-    # Create weighted distribution favoring recent dates (60% in last 6 months)
-    weights = np.linspace(0.1, 2.0, total_days)
-    weights = weights / weights.sum()
-    
     # Generate random days based on weighted distribution
-    random_days = np.random.choice(total_days, size=size, p=weights)
-    dates = [start + timedelta(days=int(day)) for day in random_days]
+    random_days = np.random.choice(total_days, size=size, p=date_weights(total_days))
+    dates = np.datetime64(start) + random_days.astype('timedelta64[D]')
     
     return pd.Series(dates)
 
-def apply_realistic_outliers(series: pd.Series, recent_date_mask: pd.Series, 
-                           column_name: str) -> pd.Series:
-    """Apply outliers primarily to recent records for specific metrics"""
-    if column_name not in ['CET1_Ratio', 'Total_Capital_Ratio', 'Leverage_Ratio', 'RWA_Growth']:
-        return series
-    
-    # Identify recent records (last 20% of date range)
-    recent_indices = recent_date_mask[recent_date_mask].index
-    
-    # Apply outliers to 2% of recent records
-    n_outliers = int(len(recent_indices) * OUTLIER_FRACTION)
-    if n_outliers == 0:
-        return series
-        
-    outlier_indices = np.random.choice(recent_indices, size=n_outliers, replace=False)
-    
-    outlier_series = series.copy()
-    
-    if column_name in ['CET1_Ratio', 'Total_Capital_Ratio', 'Leverage_Ratio']:
-        # For capital ratios, create both positive and negative outliers
-        half_outliers = max(1, n_outliers//2)
-        for idx in outlier_indices[:half_outliers]:
-            outlier_series.iloc[idx] *= (1 + np.random.uniform(0.1, 0.3))  # Positive spike
-        for idx in outlier_indices[half_outliers:]:
-            outlier_series.iloc[idx] *= (1 - np.random.uniform(0.05, 0.15))  # Negative spike
-    else:
-        # For other metrics, apply standard outlier logic
-        outlier_series.iloc[outlier_indices] *= np.random.uniform(2.0, 4.0, len(outlier_indices))
-    
-    return outlier_series
+def outlier_specs(recent_threshold: datetime) -> List[Dict]:
+    """Outliers on 2% of recent records for the key metrics, see scenarios.apply_scenarios"""
+    # For capital ratios, create both positive and negative outliers
+    specs = [
+        {
+            'name': f'{column} outliers',
+            'since': recent_threshold,
+            'fraction': OUTLIER_FRACTION,
+            'groups': [
+                {'share': 0.5, 'scale': {column: (1.1, 1.3)}},  # Positive spike
+                {'share': 0.5, 'scale': {column: (0.85, 0.95)}},  # Negative spike
+            ],
+        }
+        for column in ['CET1_Ratio', 'Total_Capital_Ratio', 'Leverage_Ratio']
+    ]
+    # For other metrics, apply standard outlier logic
+    specs.append({
+        'name': 'RWA_Growth outliers',
+        'since': recent_threshold,
+        'fraction': OUTLIER_FRACTION,
+        'scale': {'RWA_Growth': (2.0, 4.0)},
+    })
+    return specs
 
-def inject_scenarios(df: pd.DataFrame, config: Dict) -> pd.DataFrame:
-    """Apply story-driven scenarios to baseline data"""
-    df_enhanced = df.copy()
-    
-    # Sort by date to identify time periods
-    df_enhanced = df_enhanced.sort_values('Report_Date').reset_index(drop=True)
+def scenario_specs(config: Dict, reference_date: datetime) -> List[Dict]:
+    """Translate SCENARIO_CONFIG into scenario specs for scenarios.apply_scenarios"""
+    specs = []
     
     # Scenario 1: Performance spike in Institutional Banking (last 90 days)
     if config['enable_performance_spike']:
-        recent_date = df_enhanced['Report_Date'].max()
-        spike_start = recent_date - timedelta(days=config['spike_period_days'])
-        
-        spike_mask = (
-            (df_enhanced['Report_Date'] >= spike_start) & 
-            (df_enhanced['Business_Unit'] == config['affected_segment'])
-        )
-        
-        # Apply improvement to capital ratios
-        df_enhanced.loc[spike_mask, 'CET1_Ratio'] *= config['spike_magnitude']
-        df_enhanced.loc[spike_mask, 'Total_Capital_Ratio'] *= (config['spike_magnitude'] * 0.9)
-        df_enhanced.loc[spike_mask, 'RWA_Growth'] *= 0.7  # Lower RWA growth
+        specs.append({
+            'name': 'performance spike',
+            'since': reference_date - timedelta(days=config['spike_period_days']),
+            'where': {'Business_Unit': config['affected_segment']},
+            # Improvement in capital ratios, lower RWA growth
+            'scale': {
+                'CET1_Ratio': config['spike_magnitude'],
+                'Total_Capital_Ratio': config['spike_magnitude'] * 0.9,
+                'RWA_Growth': 0.7,
+            },
+        })
     
     # Scenario 2: Credit risk degradation in High Risk category
     if config['enable_degradation']:
-        degradation_start = df_enhanced['Report_Date'].max() - timedelta(days=config['degradation_duration_months'] * 30)
-        
-        degradation_mask = (
-            (df_enhanced['Report_Date'] >= degradation_start) & 
-            (df_enhanced['Credit_Risk_Category'] == 'High Risk')
-        )
-        
-        # Apply degradation to risk metrics - FIXED: Use correct column names
-        df_enhanced.loc[degradation_mask, 'Credit_Loss_Provision_Millions'] *= (1 / config['degradation_magnitude'])
-        df_enhanced.loc[degradation_mask, 'NPL_Ratio'] *= (1 / config['degradation_magnitude'])
+        specs.append({
+            'name': 'credit risk degradation',
+            'since': reference_date - timedelta(days=config['degradation_duration_months'] * 30),
+            'where': {'Credit_Risk_Category': 'High Risk'},
+            'scale': {
+                'Credit_Loss_Provision_Millions': 1 / config['degradation_magnitude'],
+                'NPL_Ratio': 1 / config['degradation_magnitude'],
+            },
+        })
+    
+    return specs
+
+def inject_scenarios(df: pd.DataFrame, config: Dict, reference_date: datetime = None) -> pd.DataFrame:
+    """Apply story-driven scenarios to baseline data
+
+    Scenario windows end at reference_date, which defaults to the latest date in df.
+    Shards pass the latest date of the full range so every shard uses the same windows.
+    """
+    df_enhanced = df.copy()
     
+    # Sort by date to identify time periods
+    df_enhanced = df_enhanced.sort_values('Report_Date').reset_index(drop=True)
+    recent_date = reference_date if reference_date is not None else df_enhanced['Report_Date'].max()
+    
+    apply_scenarios(df_enhanced, scenario_specs(config, recent_date), 'Report_Date')
     return df_enhanced
 
 def generate_executive_summary(df: pd.DataFrame, config: Dict) -> Dict:
@@ -155,9 +193,13 @@ def generate_executive_summary(df: pd.DataFrame, config: Dict) -> Dict:
         'detection_guidance': 'Filter by Business Unit and time period to identify performance anomalies'
     }
 
-def main():
-    """Main data generation function"""
-    print("Starting Basel III Capital Adequacy data generation...")
+def generate_capital_adequacy_data(num_rows: int = NUM_ROWS, end_date: datetime = None,
+                                   seed: int = None, verbose: bool = True) -> pd.DataFrame:
+    """Generate the Basel III dataset with outliers and scenarios applied"""
+    log = print if verbose else (lambda *args: None)
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
     
     # Generate foundational data categories
     business_units = generate_realistic_business_units(15)
@@ -165,72 +207,67 @@ def main():
     credit_risk_categories = generate_credit_risk_categories()
     
     # Generate base date range (3 years of daily reporting)
-    end_date = datetime.now()
+    end_date = end_date or datetime.now()
     start_date = end_date - timedelta(days=3*365)
+    latest_date = start_date + timedelta(days=(end_date - start_date).days - 1)
     
-    print("Generating date series...")
-    dates = generate_date_series(start_date, end_date, NUM_ROWS)
+    log("Generating date series...")
+    dates = generate_date_series(start_date, end_date, num_rows)
     
-    # Identify recent date mask for outlier application
-    recent_threshold = dates.quantile(0.8)  # Last 20% of date range
-    recent_mask = dates >= recent_threshold
+    # Identify recent date threshold for outlier application
+    recent_threshold = recent_date_threshold(start_date, end_date, 0.8)  # Last 20% of date range
     
-    print("Generating dimensional data...")
+    stage_timer.lap('dates')
+    log("Generating dimensional data...")
     
     # Generate dimensional attributes
-    business_unit = np.random.choice(business_units, NUM_ROWS)
-    region = np.random.choice(regions, NUM_ROWS)
-    credit_risk_category = np.random.choice(credit_risk_categories, NUM_ROWS)
+    business_unit = choice_categorical(business_units, num_rows)
+    region = choice_categorical(regions, num_rows)
+    credit_risk_category = choice_categorical(credit_risk_categories, num_rows)
     
     # Basel III regulatory status
-    regulatory_status = np.random.choice(['Compliant', 'Under Review', 'Non-Compliant'], 
-                                       NUM_ROWS, p=[0.85, 0.12, 0.03])
+    regulatory_status = choice_categorical(['Compliant', 'Under Review', 'Non-Compliant'], 
+                                         num_rows, p=[0.85, 0.12, 0.03])
     
-    print("Generating Basel III capital metrics...")
+    stage_timer.lap('dimensions')
+    log("Generating Basel III capital metrics...")
     
     # Generate Basel III capital adequacy ratios with realistic ranges
     # CET1 Ratio: International banks typically maintain 10-16%
-    cet1_base = np.random.normal(12.5, 1.5, NUM_ROWS)
+    cet1_base = np.random.normal(12.5, 1.5, num_rows)
     cet1_ratio = np.clip(cet1_base, 8.0, 18.0)
     
     # Total Capital Ratio: Typically 14-20%
-    total_capital_base = cet1_ratio + np.random.normal(3.0, 1.0, NUM_ROWS)
+    total_capital_base = cet1_ratio + np.random.normal(3.0, 1.0, num_rows)
     total_capital_ratio = np.clip(total_capital_base, 10.0, 22.0)
     
     # Leverage Ratio: Basel III minimum 3%, major banks typically 4-7%
-    leverage_base = np.random.normal(5.2, 0.8, NUM_ROWS)
+    leverage_base = np.random.normal(5.2, 0.8, num_rows)
     leverage_ratio = np.clip(leverage_base, 3.0, 8.0)
     
-    print("Generating risk-weighted assets and provisions...")
+    log("Generating risk-weighted assets and provisions...")
     
     # Risk-Weighted Assets (billions USD)
-    rwa_base = np.random.lognormal(3.5, 0.8, NUM_ROWS)  # Mean around $30B
+    rwa_base = np.random.lognormal(3.5, 0.8, num_rows)  # Mean around $30B
     rwa_amount = np.clip(rwa_base, 1.0, 500.0)
     
     # RWA Growth Rate (quarterly)
-    rwa_growth = np.random.normal(0.02, 0.05, NUM_ROWS)  # 2% average growth
+    rwa_growth = np.random.normal(0.02, 0.05, num_rows)  # 2% average growth
     
     # Credit Loss Provisions (millions USD)
-    credit_loss_base = np.random.exponential(50, NUM_ROWS)
+    credit_loss_base = np.random.exponential(50, num_rows)
     credit_loss_provision = np.clip(credit_loss_base, 1.0, 2000.0)
     
     # Non-Performing Loans Ratio
-    npl_base = np.random.gamma(2, 0.5, NUM_ROWS)
+    npl_base = np.random.gamma(2, 0.5, num_rows)
     npl_ratio = np.clip(npl_base, 0.1, 8.0)
     
     # Liquidity Coverage Ratio (Basel III minimum 100%)
-    lcr_base = np.random.normal(130, 20, NUM_ROWS)
+    lcr_base = np.random.normal(130, 20, num_rows)
     lcr_ratio = np.clip(lcr_base, 100.0, 200.0)
     
-    print("Applying realistic outliers...")
-    
-    # Apply outliers to key metrics
-    cet1_ratio = apply_realistic_outliers(pd.Series(cet1_ratio), recent_mask, 'CET1_Ratio').values
-    total_capital_ratio = apply_realistic_outliers(pd.Series(total_capital_ratio), recent_mask, 'Total_Capital_Ratio').values
-    leverage_ratio = apply_realistic_outliers(pd.Series(leverage_ratio), recent_mask, 'Leverage_Ratio').values
-    rwa_growth = apply_realistic_outliers(pd.Series(rwa_growth), recent_mask, 'RWA_Growth').values
-    
-    print("Assembling DataFrame...")
+    stage_timer.lap('metrics')
+    log("Assembling DataFrame...")
     
     # Create the main DataFrame
     df = pd.DataFrame({
@@ -239,20 +276,41 @@ def main():
         'Geographic_Region': region,
         'Credit_Risk_Category': credit_risk_category,
         'Regulatory_Status': regulatory_status,
-        'CET1_Ratio': np.round(cet1_ratio, 2),
-        'Total_Capital_Ratio': np.round(total_capital_ratio, 2),
-        'Leverage_Ratio': np.round(leverage_ratio, 2),
-        'RWA_Amount_Billions': np.round(rwa_amount, 1),
-        'RWA_Growth': np.round(rwa_growth, 4),
-        'Credit_Loss_Provision_Millions': np.round(credit_loss_provision, 1),
-        'NPL_Ratio': np.round(npl_ratio, 2),
-        'LCR_Ratio': np.round(lcr_ratio, 1)
+        'CET1_Ratio': cet1_ratio,
+        'Total_Capital_Ratio': total_capital_ratio,
+        'Leverage_Ratio': leverage_ratio,
+        'RWA_Amount_Billions': rwa_amount,
+        'RWA_Growth': rwa_growth,
+        'Credit_Loss_Provision_Millions': credit_loss_provision,
+        'NPL_Ratio': npl_ratio,
+        'LCR_Ratio': lcr_ratio
+    })
+    
+    log("Applying realistic outliers...")
+    
+    # Apply outliers to key metrics, then round to reporting precision
+    apply_scenarios(df, outlier_specs(recent_threshold), 'Report_Date')
+    df = df.round({
+        'CET1_Ratio': 2, 'Total_Capital_Ratio': 2, 'Leverage_Ratio': 2,
+        'RWA_Amount_Billions': 1, 'RWA_Growth': 4, 'Credit_Loss_Provision_Millions': 1,
+        'NPL_Ratio': 2, 'LCR_Ratio': 1
     })
     
-    print("Injecting business scenarios...")
+    log("Injecting business scenarios...")
     
     # Apply story-driven scenarios
-    df_final = inject_scenarios(df, SCENARIO_CONFIG)
+    df = inject_scenarios(df, SCENARIO_CONFIG, reference_date=latest_date).astype(COLUMN_DTYPES)
+    stage_timer.lap('scenarios')
+    return df
+
+def generate_shard(num_rows: int, seed: int, row_offset: int, end_date: datetime) -> pd.DataFrame:
+    """One independent shard of the dataset, see sharding.generate_sharded"""
+    return generate_capital_adequacy_data(num_rows, end_date=end_date, seed=seed, verbose=False)
+
+def main():
+    """Main data generation function"""
+    print("Starting Basel III Capital Adequacy data generation...")
+    df_final = generate_capital_adequacy_data(NUM_ROWS)
     
     # Generate executive summary for validation
     summary = generate_executive_summary(df_final, SCENARIO_CONFIG)
@@ -274,21 +332,39 @@ def main():
     print(f"Business Impact: {summary['business_impact']}")
     print(f"Detection Guidance: {summary['detection_guidance']}")
     
-    # Export to CSV
+    stage_timer.lap('validation')
+    
+    # Export to CSV and Hyper in a single pass
     output_filename = 'basel_iii_capital_adequacy_data.csv'
-    df_final.to_csv(output_filename, index=False)
+    hyper_filename = f"basel_iii_capital_adequacy_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.hyper"
+    paths = {'csv': output_filename}
+    if importlib.util.find_spec('pantab') is not None:
+        paths['hyper'] = hyper_filename
+    write_frame(df_final, paths, table='basel_iii_capital_adequacy_data')
     print(f"\nData exported to {output_filename}")
-    try:
-        import pantab
-        hyper_filename = f"basel_iii_capital_adequacy_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.hyper"
-        pantab.frame_to_hyper(df_final, hyper_filename, table='basel_iii_capital_adequacy_data')
+    if 'hyper' in paths:
         print(f"Dataset also saved as '{hyper_filename}'")
-    except ImportError:
+    else:
         print("pantab not available - skipping Hyper file generation")
+    stage_timer.lap('export')
     
     return df_final
 
 # Execute data generation
 if __name__ == "__main__":
-    generated_data = main()
+    if SHARD_ROWS:
+        from sharding import generate_sharded, generate_streamed
+        # All shards share one date range so the scenario windows line up
+        if SHARD_SINGLE_FILE:
+            generate_streamed(generate_shard, NUM_ROWS, 'basel_iii_capital_adequacy_data',
+                              shard_rows=SHARD_ROWS, seed=RANDOM_SEED, workers=SHARD_WORKERS,
+                              formats=SHARD_FORMATS, table='basel_iii_capital_adequacy_data',
+                              shard_kwargs={'end_date': datetime.now()})
+        else:
+            generate_sharded(generate_shard, NUM_ROWS, SHARD_OUTPUT_DIR, 'basel_iii_capital_adequacy_data',
+                             shard_rows=SHARD_ROWS, seed=RANDOM_SEED, workers=SHARD_WORKERS,
+                             formats=SHARD_FORMATS, table='basel_iii_capital_adequacy_data',
+                             shard_kwargs={'end_date': datetime.now()})
+    else:
+        generated_data = main()
     print("Data generation completed successfully!")
@@ -0,0 +1,147 @@
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from columnar import widen_float32
+
+# Rows per Arrow record batch, and batches each writer may fall behind the producer
+BATCH_ROWS = 100_000
+QUEUE_BATCHES = 4
+
+
+def _write_parquet(path: str, schema: pa.Schema, batches: Iterator[pa.RecordBatch], table: str) -> None:
+    # Categorical columns arrive as dictionary arrays and stay dictionary-encoded
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _write_csv(path: str, schema: pa.Schema, batches: Iterator[pa.RecordBatch], table: str) -> None:
+    options = pacsv.WriteOptions(quoting_style='needed')
+    with pacsv.CSVWriter(path, schema, write_options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _hyper_schema(schema: pa.Schema) -> pa.Schema:
+    return pa.schema([
+        pa.field(field.name, pa.float64()) if field.type == pa.float32() else field
+        for field in schema
+    ])
+
+
+def _hyper_batch(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+    columns = [
+        pa.array(widen_float32(column.to_numpy(zero_copy_only=False)), from_pandas=True)
+        if column.type == pa.float32() else column
+        for column in batch.columns
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _write_hyper(path: str, schema: pa.Schema, batches: Iterator[pa.RecordBatch], table: str) -> None:
+    import pantab
+    # Hyper has no 32-bit floats; pantab reads the batches as an Arrow stream
+    hyper_schema = _hyper_schema(schema)
+    reader = pa.RecordBatchReader.from_batches(hyper_schema, (_hyper_batch(batch, hyper_schema) for batch in batches))
+    pantab.frame_to_hyper(reader, path, table=table)
+
+
+def _frame_schema(frame: pd.DataFrame) -> pa.Schema:
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    # Later frames may have more categories than the first, so every dictionary gets int32 indices
+    return pa.schema([
+        pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type, field.type.ordered))
+        if pa.types.is_dictionary(field.type) else field
+        for field in schema
+    ], metadata=schema.metadata)
+
+
+WRITERS = {
+    'parquet': _write_parquet,
+    'csv': _write_csv,
+    'hyper': _write_hyper,
+}
+
+
+class _WriterThread(threading.Thread):
+    """Runs one writer over the batches put on its bounded queue"""
+
+    def __init__(self, file_format: str, path: str, schema: pa.Schema, table: str):
+        super().__init__(name=f'export-{file_format}', daemon=True)
+        self.file_format = file_format
+        self.path = path
+        self.schema = schema
+        self.table = table
+        self.queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.finished = False
+        self.error = None
+
+    def batches(self) -> Iterator[pa.RecordBatch]:
+        while not self.finished:
+            batch = self.queue.get()
+            if batch is None:
+                self.finished = True
+                return
+            yield batch
+
+    def run(self) -> None:
+        try:
+            WRITERS[self.file_format](self.path, self.schema, self.batches(), self.table)
+        except BaseException as e:
+            self.error = e
+            # Keep draining so the producer never blocks on a failed writer
+            for _ in self.batches():
+                pass
+
+
+def write_batches(frames: Iterable[pd.DataFrame], paths: Dict[str, str], table: str = 'Extract') -> List[str]:
+    """Convert frames to Arrow once and write them to every format in paths in parallel
+
+    paths maps 'parquet', 'csv' and/or 'hyper' to output files. Each frame becomes one
+    record batch, shared by all writers, so only a few batches are in memory at a time.
+    Returns the written paths; raises the first writer error after all writers finish.
+    """
+    unknown = set(paths) - set(WRITERS)
+    if unknown:
+        raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+
+    schema = None
+    writers = []
+    try:
+        for frame in frames:
+            if schema is None:
+                schema = _frame_schema(frame)
+                writers = [_WriterThread(file_format, path, schema, table) for file_format, path in paths.items()]
+                for writer in writers:
+                    writer.start()
+            batch = pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False)
+            for writer in writers:
+                writer.queue.put(batch)
+    finally:
+        for writer in writers:
+            writer.queue.put(None)
+        for writer in writers:
+            writer.join()
+
+    for writer in writers:
+        if writer.error is not None:
+            raise RuntimeError(f"{writer.file_format} export to {writer.path} failed: {writer.error}") from writer.error
+    return [writer.path for writer in writers]
+
+
+def frame_batches(df: pd.DataFrame, batch_rows: int = BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """Fixed-size row slices of df (views, not copies)"""
+    for start in range(0, max(len(df), 1), batch_rows):
+        yield df.iloc[start:start + batch_rows]
+
+
+def write_frame(df: pd.DataFrame, paths: Dict[str, str], table: str = 'Extract',
+                 batch_rows: int = BATCH_ROWS) -> List[str]:
+    """Write df to every format in paths in a single pass, see write_batches"""
+    return write_batches(frame_batches(df, batch_rows), paths, table)
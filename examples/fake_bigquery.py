@@ -0,0 +1,283 @@
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from bigquery_extract import ExtractSource
+
+# A local stand-in for a BigQuery table, to run and benchmark bigquery_extract without GCP.
+# Every value is a hash of the row's id and its column, so a row reads the same however
+# the table is sliced, and nothing is held in memory but the batch being served.
+
+# Rows per record batch of a read stream
+PAGE_ROWS = 20_000
+# Distinct values of each string column
+STRING_VALUES = 1_000
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_EPOCH_2020_DAYS = 18_262
+_FIVE_YEARS_US = 5 * 365 * 86_400 * 10 ** 6
+
+
+@dataclass(frozen=True)
+class SchemaField:
+    """The parts of google.cloud.bigquery.SchemaField the extractor reads"""
+    name: str
+    field_type: str
+    mode: str = 'NULLABLE'
+    fields: Tuple['SchemaField', ...] = ()
+
+
+_EVENTS = [
+    SchemaField('id', 'INTEGER', 'REQUIRED'),
+    SchemaField('created_at', 'TIMESTAMP'),
+    SchemaField('type', 'STRING'),
+    SchemaField('actor', 'STRING'),
+    SchemaField('repository', 'STRING'),
+    SchemaField('size', 'INTEGER'),
+    SchemaField('score', 'FLOAT'),
+    SchemaField('public', 'BOOLEAN'),
+]
+
+SCHEMAS: Dict[str, List[SchemaField]] = {
+    'events': _EVENTS,
+    # One column of every scalar type, served as the Storage Read API serves it
+    'all_types': [SchemaField('id', 'INTEGER', 'REQUIRED')] + [
+        SchemaField(f"{field_type.lower()}_value", field_type)
+        for field_type in ('INTEGER', 'FLOAT', 'NUMERIC', 'BIGNUMERIC', 'BOOLEAN', 'STRING', 'BYTES',
+                           'DATE', 'DATETIME', 'TIMESTAMP', 'TIME', 'GEOGRAPHY', 'JSON')
+    ],
+    'nested': _EVENTS + [
+        SchemaField('labels', 'STRING', 'REPEATED'),
+        SchemaField('payload', 'RECORD', fields=(SchemaField('action', 'STRING'), SchemaField('count', 'INTEGER'))),
+    ],
+}
+
+_COMPARISON = re.compile(r"^`?(\w+)`?\s*(<=|>=|<|>|=)\s*(-?\d+)$")
+_NULL_CHECK = re.compile(r"^`?(\w+)`?\s+IS\s+(NOT\s+)?NULL$", re.IGNORECASE)
+_HASH_SLICE = re.compile(r"^ABS\(MOD\(FARM_FINGERPRINT\((.*)\),\s*(\d+)\)\)\s*=\s*(\d+)$")
+
+
+def _mix(ids: np.ndarray, salt: int) -> np.ndarray:
+    """splitmix64 of every id with salt, as uint64"""
+    x = ids.astype(np.uint64) * np.uint64(_GOLDEN) + np.uint64(salt % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _enclosed(text: str) -> bool:
+    """True if the brackets opening text close at its end"""
+    if not text.startswith('('):
+        return False
+    depth = 0
+    for i, char in enumerate(text):
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if depth == 0:
+            return i == len(text) - 1
+    return False
+
+
+def _conjuncts(where: str) -> List[str]:
+    """The terms a filter ANDs together, brackets removed"""
+    where = where.strip()
+    if _enclosed(where):
+        return _conjuncts(where[1:-1])
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    while i < len(where):
+        char = where[i]
+        if char == "'":
+            quoted = not quoted
+        elif not quoted:
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif depth == 0 and where[i:i + 5].upper() == ' AND ':
+                parts.append(where[start:i])
+                start = i = i + 5
+                continue
+        i += 1
+    if start == 0:
+        return [where]
+    parts.append(where[start:])
+    return [term for part in parts for term in _conjuncts(part)]
+
+
+class FakeBigQuerySource(ExtractSource):
+    """num_rows synthetic rows with a BigQuery schema, served like BigQuery serves them.
+
+    The id column holds 0 to num_rows - 1 and is the table's range partitioning column
+    (partitioned=False leaves the table unpartitioned, so it is sliced by hash). Nullable
+    columns are about 6% NULL. Filters may combine, with AND, comparisons of the id column
+    with integers and the FARM_FINGERPRINT hash slices the extractor plans. Every query
+    and every stream page first waits latency seconds, like a round trip to BigQuery.
+    """
+
+    def __init__(self, schema: Sequence[SchemaField], num_rows: int, id_column: str = 'id',
+                 partitioned: bool = True, latency: float = 0.0, page_rows: int = PAGE_ROWS):
+        if not any(field.name == id_column and field.field_type in ('INTEGER', 'INT64') for field in schema):
+            raise ValueError(f"schema needs an INTEGER column {id_column}")
+        self.schema = list(schema)
+        self.num_rows = num_rows
+        self.id_column = id_column
+        self.partitioned = partitioned
+        self.latency = latency
+        self.page_rows = page_rows
+        self.fields = {field.name: field for field in self.schema}
+        self._streams: Dict[str, Tuple[List[str], int, int, List[Tuple[str, int, int]]]] = {}
+
+    def _strings(self, field: SchemaField, codes: np.ndarray) -> pa.Array:
+        if field.field_type == 'GEOGRAPHY':
+            values = [f"POINT({i % 360 - 180} {i % 180 - 90})" for i in range(STRING_VALUES)]
+        elif field.field_type == 'JSON':
+            values = [f'{{"{field.name}": {i}}}' for i in range(STRING_VALUES)]
+        else:
+            values = [f"{field.name}_{i}" for i in range(STRING_VALUES)]
+        array = pa.array([value.encode() for value in values]) if field.field_type == 'BYTES' else pa.array(values)
+        return array.take(pa.array(codes.astype(np.int64)))
+
+    def _values(self, field: SchemaField, ids: np.ndarray, h: np.ndarray) -> pa.Array:
+        field_type = field.field_type
+        if field.name == self.id_column:
+            return pa.array(ids.astype(np.int64))
+        if field_type in ('INTEGER', 'INT64'):
+            return pa.array((h % np.uint64(1_000_000)).astype(np.int64))
+        if field_type in ('FLOAT', 'FLOAT64'):
+            return pa.array((h >> np.uint64(11)).astype(np.float64) * (1000 / 2 ** 53))
+        if field_type == 'NUMERIC':
+            return pa.array((h % np.uint64(10 ** 9)).astype(np.int64)).cast(pa.decimal128(38, 9))
+        if field_type == 'BIGNUMERIC':
+            return pa.array((h % np.uint64(10 ** 9)).astype(np.int64)).cast(pa.decimal256(76, 38))
+        if field_type in ('BOOLEAN', 'BOOL'):
+            return pa.array((h & np.uint64(1)).astype(bool))
+        if field_type == 'DATE':
+            return pa.array((_EPOCH_2020_DAYS + h % np.uint64(1826)).astype(np.int32)).cast(pa.date32())
+        if field_type in ('DATETIME', 'TIMESTAMP'):
+            micros = (_EPOCH_2020_DAYS * 86_400 * 10 ** 6 + h % np.uint64(_FIVE_YEARS_US)).astype(np.int64)
+            return pa.array(micros).cast(pa.timestamp('us', tz='UTC' if field_type == 'TIMESTAMP' else None))
+        if field_type == 'TIME':
+            return pa.array((h % np.uint64(86_400 * 10 ** 6)).astype(np.int64)).cast(pa.time64('us'))
+        if field_type in ('STRING', 'BYTES', 'GEOGRAPHY', 'JSON'):
+            return self._strings(field, h % np.uint64(STRING_VALUES))
+        raise ValueError(f"FakeBigQuerySource can't generate {field_type} column {field.name}")
+
+    def _column(self, field: SchemaField, ids: np.ndarray) -> pa.Array:
+        h = _mix(ids, zlib.crc32(field.name.encode()))
+        if field.mode == 'REPEATED':
+            # Up to 3 elements, each generated as a row of its own id
+            lengths = (h % np.uint64(4)).astype(np.int64)
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            positions = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+            element = SchemaField(field.name, field.field_type, 'REQUIRED', field.fields)
+            values = self._column(element, np.repeat(ids * 4, lengths) + positions)
+            return pa.ListArray.from_arrays(pa.array(offsets.astype(np.int32)), values)
+        if field.field_type in ('RECORD', 'STRUCT'):
+            array = pa.StructArray.from_arrays([self._column(sub, ids) for sub in field.fields],
+                                               names=[sub.name for sub in field.fields])
+        else:
+            array = self._values(field, ids, h)
+        if field.mode == 'NULLABLE' and field.name != self.id_column:
+            array = pc.if_else(pa.array((h >> np.uint64(60)) == 0), pa.scalar(None, array.type), array)
+        return array
+
+    def _rows(self, columns: List[str], ids: np.ndarray) -> pa.Table:
+        unknown = [column for column in columns if column not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        return pa.table({column: self._column(self.fields[column], ids) for column in columns})
+
+    def _select(self, where: Optional[str]) -> Tuple[int, int, List[Tuple[str, int, int]]]:
+        """The id range a filter keeps, and the (key, parts, part) hash slices within it"""
+        low, high, hashes = 0, self.num_rows, []
+        for term in _conjuncts(where) if where else []:
+            comparison = _COMPARISON.match(term)
+            null_check = _NULL_CHECK.match(term)
+            hash_slice = _HASH_SLICE.match(term)
+            if comparison and comparison.group(1) == self.id_column:
+                op, value = comparison.group(2), int(comparison.group(3))
+                if op in ('>', '>=', '='):
+                    low = max(low, value + 1 if op == '>' else value)
+                if op in ('<', '<=', '='):
+                    high = min(high, value if op == '<' else value + 1)
+            elif null_check and null_check.group(1) == self.id_column:
+                if not null_check.group(2):
+                    high = low
+            elif hash_slice:
+                hashes.append((hash_slice.group(1), int(hash_slice.group(2)), int(hash_slice.group(3))))
+            else:
+                raise NotImplementedError(f"FakeBigQuerySource can't evaluate {term!r}: only comparisons of "
+                                          f"{self.id_column} with integers and hash slices")
+        return low, max(low, high), hashes
+
+    def _ids(self, low: int, high: int, hashes: List[Tuple[str, int, int]]) -> np.ndarray:
+        ids = np.arange(low, high, dtype=np.int64)
+        for key, parts, part in hashes:
+            ids = ids[_mix(ids, zlib.crc32(key.encode())) % np.uint64(parts) == part]
+        return ids
+
+    def get_table(self):
+        sample = self._rows([field.name for field in self.schema], np.arange(min(self.num_rows, 1000)))
+        return SimpleNamespace(
+            schema=self.schema,
+            num_rows=self.num_rows,
+            num_bytes=int(sample.nbytes * self.num_rows / max(sample.num_rows, 1)),
+            time_partitioning=None,
+            range_partitioning=SimpleNamespace(field=self.id_column) if self.partitioned else None,
+            clustering_fields=None,
+        )
+
+    def count_rows(self, where: Optional[str]) -> int:
+        time.sleep(self.latency)
+        low, high, hashes = self._select(where)
+        return len(self._ids(low, high, hashes)) if hashes else high - low
+
+    def quantiles(self, column: str, parts: int, where: Optional[str]) -> List[str]:
+        if column != self.id_column:
+            raise NotImplementedError(f"FakeBigQuerySource only has quantiles of {self.id_column}")
+        time.sleep(self.latency)
+        low, high, hashes = self._select(where)
+        ids = self._ids(low, high, hashes) if hashes else None
+        count = len(ids) if hashes else high - low
+        if count == 0:
+            return []
+        positions = [(count - 1) * k // parts for k in range(parts + 1)]
+        return [str(ids[p] if hashes else low + p) for p in positions]
+
+    def max_value(self, column: str, where: Optional[str]) -> Optional[str]:
+        if column != self.id_column:
+            raise NotImplementedError(f"FakeBigQuerySource only has the maximum of {self.id_column}")
+        time.sleep(self.latency)
+        low, high, hashes = self._select(where)
+        if hashes:
+            ids = self._ids(low, high, hashes)
+            return str(ids[-1]) if len(ids) else None
+        return str(high - 1) if high > low else None
+
+    def fetch(self, columns: List[str], where: Optional[str]) -> pa.Table:
+        time.sleep(self.latency)
+        return self._rows(columns, self._ids(*self._select(where)))
+
+    def read_session(self, columns: List[str], where: Optional[str], max_streams: int) -> List[str]:
+        time.sleep(self.latency)
+        low, high, hashes = self._select(where)
+        count = max(1, min(max_streams, -(-(high - low) // self.page_rows)))
+        bounds = np.linspace(low, high, count + 1).astype(np.int64)
+        names = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            name = f"fake/streams/{len(self._streams)}"
+            self._streams[name] = (columns, int(start), int(end), hashes)
+            names.append(name)
+        return names
+
+    def read_stream(self, stream: str) -> Iterator[pa.RecordBatch]:
+        columns, low, high, hashes = self._streams[stream]
+        for start in range(low, high, self.page_rows):
+            time.sleep(self.latency)
+            yield from self._rows(columns, self._ids(start, min(start + self.page_rows, high), hashes)).to_batches()
@@ -3,36 +3,82 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
-from google.colab import files
 
-def generate_loan_application_dataset(num_rows=150000, outlier_fraction=0.02):
+import stage_timer
+from columnar import choice_categorical, code_labels, format_datetimes
+from export import write_frame
+
+# By default all NUM_ROWS rows are built in one DataFrame before they are written,
+# so memory grows with NUM_ROWS; for large NUM_ROWS use sharded mode.
+#
+# Sharded mode - set SHARD_ROWS to generate NUM_ROWS as independent seeded shards
+# in parallel, each written straight to its own part files under SHARD_OUTPUT_DIR
+NUM_ROWS = 150000
+SHARD_ROWS = None
+SHARD_WORKERS = None  # defaults to the number of cores
+SHARD_FORMATS = ('parquet',)  # any of 'parquet', 'hyper', 'csv'
+SHARD_OUTPUT_DIR = 'bendigo_adelaide_bank_loan_applications_parts'
+SHARD_SINGLE_FILE = False  # stream the shards, in order, into one file per format instead
+
+# Compact output types - dimensions as categoricals, rates and day counts as
+# float32 (7 significant digits), flags as int8, AUD amounts stay float64
+COLUMN_DTYPES = {
+    'Application_Submitted_Hour_Of_Day': 'int8',
+    'Property_State': 'category',
+    'Property_Postcode': 'category',
+    'Property_Region_Name': 'category',
+    'Loan_Type': 'category',
+    'Loan_Purpose': 'category',
+    'Application_Channel': 'category',
+    'Lead_Source': 'category',
+    'Decision_Outcome': 'category',
+    'Customer_Segment': 'category',
+    'Loan_Officer_ID': 'category',
+    'Branch_ID': 'category',
+    'Competitor_Bank_Refinanced_From': 'category',
+    'Customer_Credit_Score': 'int16',
+    'Application_Processing_Time_To_Decision_Days': 'float32',
+    'Loan_Settlement_Duration_Days': 'float32',
+    'Application_Current_Status': 'category',
+    'Interest_Rate_Offered_Percent': 'float32',
+    'Loan_To_Value_Ratio_LVR_Percent': 'float32',
+    'Is_Online_Application_Flag': 'int8',
+    'Is_Approved_Application_Flag': 'int8',
+    'Is_Settled_Application_Flag': 'int8',
+    'Application_Record_Count': 'int8',
+}
+
+def generate_loan_application_dataset(num_rows=150000, outlier_fraction=0.02, seed=42, id_offset=0, verbose=True):
     """
     Generate realistic loan application data for Bendigo and Adelaide Bank
     
     Parameters:
     - num_rows: Number of loan application records to generate (default: 150,000)
     - outlier_fraction: Percentage of records with outlier values (default: 2%)
+    - seed: Random seed, the same seed always produces the same dataset (default: 42)
+    - id_offset: Application IDs start after this number, so shards get distinct IDs (default: 0)
+    - verbose: Print progress and summary rates (default: True)
     
     Returns:
     - pandas DataFrame with loan application data
     """
     
     # Set seed for reproducibility
-    np.random.seed(42)
-    random.seed(42)
+    np.random.seed(seed)
+    random.seed(seed)
+    log = print if verbose else (lambda *args: None)
     
-    print(f"Generating {num_rows:,} loan application records...")
+    log(f"Generating {num_rows:,} loan application records...")
     
     # Define date ranges (last 3 years as specified)
     end_date = datetime(2025, 5, 24, 23, 59, 59)
     start_date = datetime(2022, 5, 1, 0, 0, 0)
     
     # Generate unique Application IDs (sequential)
-    application_ids = [f"APP-{str(i).zfill(7)}" for i in range(1, num_rows + 1)]
+    application_ids = np.char.add('APP-', np.char.zfill(np.arange(id_offset + 1, id_offset + num_rows + 1).astype(str), 7))
     
     # Generate Customer IDs (allowing multiple applications per customer)
     unique_customer_count = 35000  # Pool of 35,000 unique customers
-    customer_ids = [f"CUST-{str(i).zfill(5)}" for i in range(1, unique_customer_count + 1)]
     
     # Australian states with realistic distribution (VIC, NSW, QLD, SA focus)
     states = ['VIC', 'NSW', 'QLD', 'SA', 'WA', 'TAS', 'NT', 'ACT']
@@ -109,80 +155,65 @@ def generate_loan_application_dataset(num_rows=150000, outlier_fraction=0.02):
     
     # Generate basic identifiers
     data['Application_ID'] = application_ids
-    data['Customer_ID'] = np.random.choice(customer_ids, size=num_rows, replace=True)
+    data['Customer_ID'] = code_labels(np.random.randint(1, unique_customer_count + 1, num_rows), 'CUST-{:05d}')
     
     # Generate timestamps with business hours bias (9 AM - 5 PM weekdays)
-    def generate_business_hour_timestamp():
-        # Random date in range
-        days_diff = (end_date - start_date).days
-        random_days = np.random.randint(0, days_diff, num_rows)
-        base_dates = [start_date + timedelta(days=int(d)) for d in random_days]
-        
-        timestamps = []
-        for base_date in base_dates:
-            # 70% chance of business hours (9-17), 30% chance of any hour
-            if np.random.random() < 0.7 and base_date.weekday() < 5:  # Weekday
-                hour = np.random.randint(9, 17)
-            else:
-                hour = np.random.randint(0, 24)
-            
-            minute = np.random.randint(0, 60)
-            second = np.random.randint(0, 60)
-            
-            timestamp = base_date.replace(hour=hour, minute=minute, second=second)
-            timestamps.append(timestamp)
-        
-        return timestamps
+    days_diff = (end_date - start_date).days
+    event_days = np.datetime64(start_date, 'D') + np.random.randint(0, days_diff, num_rows)
+    # 1970-01-01 was a Thursday, so this gives Monday == 0 like datetime.weekday()
+    weekdays = (event_days.astype(np.int64) + 3) % 7
+    # 70% chance of business hours (9-17) on weekdays, otherwise any hour
+    business_hours = (np.random.random(num_rows) < 0.7) & (weekdays < 5)
+    hours = np.where(business_hours, np.random.randint(9, 17, num_rows), np.random.randint(0, 24, num_rows))
+    minutes = np.random.randint(0, 60, num_rows)
+    seconds = np.random.randint(0, 60, num_rows)
+    event_timestamps = event_days.astype('datetime64[s]') + (hours * 3600 + minutes * 60 + seconds).astype('timedelta64[s]')
     
-    event_timestamps = generate_business_hour_timestamp()
     data['Event_Timestamp_UTC'] = event_timestamps
-    data['Event_Date'] = [ts.date() for ts in event_timestamps]
-    data['Application_Submitted_Hour_Of_Day'] = [ts.hour for ts in event_timestamps]
+    data['Event_Date'] = event_days
+    data['Application_Submitted_Hour_Of_Day'] = hours
+    
+    stage_timer.lap('dates')
     
     # Generate geographic data
-    selected_states = np.random.choice(states, size=num_rows, p=state_weights)
+    state_codes = np.random.choice(len(states), size=num_rows, p=state_weights)
+    selected_states = np.array(states, dtype=object)[state_codes]
     data['Property_State'] = selected_states
     
-    # Generate postcodes based on states
-    postcodes = []
-    regions = []
-    for state in selected_states:
-        postcode = np.random.choice(postcodes_by_state[state])
-        postcodes.append(postcode)
-        regions.append(region_mapping[state])
+    # Generate postcodes based on states (one draw per state group)
+    postcodes = np.empty(num_rows, dtype=object)
+    for code, state in enumerate(states):
+        state_mask = state_codes == code
+        postcodes[state_mask] = np.random.choice(postcodes_by_state[state], size=state_mask.sum())
     
     data['Property_Postcode'] = postcodes
-    data['Property_Region_Name'] = regions
+    data['Property_Region_Name'] = np.array([region_mapping[state] for state in states], dtype=object)[state_codes]
     
     # Generate categorical data
-    data['Loan_Type'] = np.random.choice(loan_types, size=num_rows, p=loan_type_weights)
-    data['Loan_Purpose'] = np.random.choice(loan_purposes, size=num_rows, p=loan_purpose_weights)
-    data['Application_Channel'] = np.random.choice(application_channels, size=num_rows, p=channel_weights)
-    data['Lead_Source'] = np.random.choice(lead_sources, size=num_rows, p=lead_source_weights)
-    data['Decision_Outcome'] = np.random.choice(decision_outcomes, size=num_rows, p=outcome_weights)
-    data['Customer_Segment'] = np.random.choice(customer_segments, size=num_rows, p=segment_weights)
+    data['Loan_Type'] = choice_categorical(loan_types, num_rows, p=loan_type_weights)
+    data['Loan_Purpose'] = choice_categorical(loan_purposes, num_rows, p=loan_purpose_weights)
+    data['Application_Channel'] = choice_categorical(application_channels, num_rows, p=channel_weights)
+    data['Lead_Source'] = choice_categorical(lead_sources, num_rows, p=lead_source_weights)
+    data['Decision_Outcome'] = choice_categorical(decision_outcomes, num_rows, p=outcome_weights)
+    data['Customer_Segment'] = choice_categorical(customer_segments, num_rows, p=segment_weights)
     
     # Generate loan officer IDs
-    data['Loan_Officer_ID'] = np.random.choice(loan_officer_ids, size=num_rows)
+    data['Loan_Officer_ID'] = choice_categorical(loan_officer_ids, num_rows)
     
     # Generate branch IDs (only for branch channels)
-    branch_id_list = []
-    for channel in data['Application_Channel']:
-        if 'Branch' in channel:
-            branch_id_list.append(np.random.choice(branch_ids))
-        else:
-            branch_id_list.append(None)
+    branch_mask = data['Application_Channel'].isin([channel for channel in application_channels if 'Branch' in channel])
+    branch_id_list = np.full(num_rows, None, dtype=object)
+    branch_id_list[branch_mask] = np.random.choice(branch_ids, size=branch_mask.sum())
     data['Branch_ID'] = branch_id_list
     
     # Generate competitor bank data (only for refinancing)
-    competitor_list = []
-    for purpose in data['Loan_Purpose']:
-        if purpose == 'Refinance Existing Loan':
-            competitor_list.append(np.random.choice(competitor_banks))
-        else:
-            competitor_list.append(None)
+    refinance_mask = data['Loan_Purpose'] == 'Refinance Existing Loan'
+    competitor_list = np.full(num_rows, None, dtype=object)
+    competitor_list[refinance_mask] = np.random.choice(competitor_banks, size=refinance_mask.sum())
     data['Competitor_Bank_Refinanced_From'] = competitor_list
     
+    stage_timer.lap('dimensions')
+    
     # Generate financial data
     # Loan amounts with realistic distribution
     loan_amounts = np.random.normal(450000, 150000, num_rows)
@@ -201,186 +232,166 @@ def generate_loan_application_dataset(num_rows=150000, outlier_fraction=0.02):
     data['Customer_Credit_Score'] = credit_scores
     
     # Generate decision and settlement dates
-    decision_dates = []
-    settlement_dates = []
-    processing_times = []
-    settlement_durations = []
-    
-    for i, (event_date, outcome) in enumerate(zip(data['Event_Date'], data['Decision_Outcome'])):
-        # Decision date (1-30 days after application, log-normal distribution)
-        if outcome != 'Withdrawn by Applicant' or np.random.random() < 0.9:  # 90% have decisions
-            days_to_decision = max(1, int(np.random.lognormal(2.0, 0.8)))
-            days_to_decision = min(days_to_decision, 30)
-            decision_date = event_date + timedelta(days=days_to_decision)
-            decision_dates.append(decision_date)
-            processing_times.append(days_to_decision)
-            
-            # Settlement date (only for approved loans)
-            if outcome in ['Approved', 'Conditionally Approved'] and np.random.random() < 0.85:  # 85% settle
-                days_to_settlement = np.random.randint(7, 61)  # 7-60 days after decision
-                settlement_date = decision_date + timedelta(days=days_to_settlement)
-                settlement_dates.append(settlement_date)
-                settlement_durations.append((settlement_date - event_date).days)
-            else:
-                settlement_dates.append(None)
-                settlement_durations.append(None)
-        else:
-            decision_dates.append(None)
-            settlement_dates.append(None)
-            processing_times.append(None)
-            settlement_durations.append(None)
+    outcomes = data['Decision_Outcome']
+    is_approved = outcomes.isin(['Approved', 'Conditionally Approved'])
+    
+    # Decision date (1-30 days after application, log-normal distribution), 90% of withdrawals have one
+    has_decision = (outcomes != 'Withdrawn by Applicant') | (np.random.random(num_rows) < 0.9)
+    days_to_decision = np.clip(np.random.lognormal(2.0, 0.8, num_rows).astype(np.int64), 1, 30)
+    
+    # Settlement date (only for approved loans, 85% settle 7-60 days after decision)
+    is_settled = has_decision & is_approved & (np.random.random(num_rows) < 0.85)
+    days_to_settlement = np.random.randint(7, 61, num_rows)
+    
+    decision_dates = np.where(has_decision, event_days + days_to_decision, np.datetime64('NaT'))
+    settlement_dates = np.where(is_settled, decision_dates + days_to_settlement, np.datetime64('NaT'))
     
     data['Decision_Date'] = decision_dates
     data['Settlement_Date'] = settlement_dates
-    data['Application_Processing_Time_To_Decision_Days'] = processing_times
-    data['Loan_Settlement_Duration_Days'] = settlement_durations
-    
-    # Generate application status based on dates and outcomes
-    current_statuses = []
-    for outcome, decision_date, settlement_date in zip(data['Decision_Outcome'], 
-                                                      data['Decision_Date'], 
-                                                      data['Settlement_Date']):
-        if settlement_date is not None:
-            current_statuses.append('Settled')
-        elif outcome == 'Approved' and decision_date is not None:
-            current_statuses.append('Offer Issued')
-        elif outcome == 'Declined':
-            current_statuses.append('Closed - Declined')
-        elif outcome == 'Withdrawn by Applicant':
-            current_statuses.append('Closed - Withdrawn')
-        elif decision_date is not None:
-            current_statuses.append('Pending Final Review')
-        else:
-            current_statuses.append('Under Assessment')
-    
-    data['Application_Current_Status'] = current_statuses
-    
-    # Generate approved loan amounts and interest rates
-    approved_amounts = []
-    interest_rates = []
-    
-    for i, outcome in enumerate(data['Decision_Outcome']):
-        if outcome in ['Approved', 'Conditionally Approved']:
-            # Approved amount (90-100% of requested)
-            approval_ratio = np.random.uniform(0.90, 1.00)
-            approved_amount = data['Loan_Amount_Requested_AUD'][i] * approval_ratio
-            approved_amounts.append(round(approved_amount, 2))
-            
-            # Interest rate based on credit score and loan type
-            base_rate = 5.5
-            credit_adjustment = (750 - data['Customer_Credit_Score'][i]) * 0.01
-            rate_variation = np.random.normal(0, 0.3)
-            interest_rate = base_rate + credit_adjustment + rate_variation
-            interest_rate = max(3.0, min(7.5, interest_rate))
-            interest_rates.append(round(interest_rate, 2))
-        else:
-            approved_amounts.append(0.0)
-            interest_rates.append(None)
-    
-    data['Loan_Amount_Approved_AUD'] = approved_amounts
-    data['Interest_Rate_Offered_Percent'] = interest_rates
+    data['Application_Processing_Time_To_Decision_Days'] = np.where(has_decision, days_to_decision, np.nan)
+    data['Loan_Settlement_Duration_Days'] = np.where(is_settled, days_to_decision + days_to_settlement, np.nan)
+    
+    # Generate application status based on dates and outcomes (first matching condition wins)
+    data['Application_Current_Status'] = np.select(
+        [
+            is_settled,
+            (outcomes == 'Approved') & has_decision,
+            outcomes == 'Declined',
+            outcomes == 'Withdrawn by Applicant',
+            has_decision,
+        ],
+        ['Settled', 'Offer Issued', 'Closed - Declined', 'Closed - Withdrawn', 'Pending Final Review'],
+        default='Under Assessment'
+    ).astype(object)
+    
+    # Generate approved loan amounts (90-100% of requested) and interest rates
+    approval_ratios = np.random.uniform(0.90, 1.00, num_rows)
+    approved_amounts = np.round(data['Loan_Amount_Requested_AUD'] * approval_ratios, 2)
+    data['Loan_Amount_Approved_AUD'] = np.where(is_approved, approved_amounts, 0.0)
+    
+    # Interest rate based on credit score and loan type
+    base_rate = 5.5
+    credit_adjustment = (750 - data['Customer_Credit_Score']) * 0.01
+    rate_variation = np.random.normal(0, 0.3, num_rows)
+    interest_rates = np.clip(base_rate + credit_adjustment + rate_variation, 3.0, 7.5)
+    data['Interest_Rate_Offered_Percent'] = np.where(is_approved, np.round(interest_rates, 2), np.nan)
     
     # Calculate LVR for approved loans
-    lvr_percentages = []
-    for approved_amt, property_val in zip(data['Loan_Amount_Approved_AUD'], 
-                                         data['Property_Valuation_AUD']):
-        if approved_amt > 0:
-            lvr = (approved_amt / property_val) * 100
-            lvr_percentages.append(round(lvr, 2))
-        else:
-            lvr_percentages.append(None)
-    
-    data['Loan_To_Value_Ratio_LVR_Percent'] = lvr_percentages
+    approved_amt = data['Loan_Amount_Approved_AUD']
+    data['Loan_To_Value_Ratio_LVR_Percent'] = np.where(
+        approved_amt > 0, np.round(approved_amt / data['Property_Valuation_AUD'] * 100, 2), np.nan
+    )
     
     # Generate flag columns
-    data['Is_Online_Application_Flag'] = [
-        1 if channel in ['Online Portal', 'Mobile App'] else 0 
-        for channel in data['Application_Channel']
-    ]
-    
-    data['Is_Approved_Application_Flag'] = [
-        1 if outcome in ['Approved', 'Conditionally Approved'] else 0 
-        for outcome in data['Decision_Outcome']
-    ]
-    
-    data['Is_Settled_Application_Flag'] = [
-        1 if settlement_date is not None else 0 
-        for settlement_date in data['Settlement_Date']
-    ]
+    data['Is_Online_Application_Flag'] = data['Application_Channel'].isin(['Online Portal', 'Mobile App']).astype(int)
+    data['Is_Approved_Application_Flag'] = is_approved.astype(int)
+    data['Is_Settled_Application_Flag'] = is_settled.astype(int)
     
     # Application record count (always 1)
-    data['Application_Record_Count'] = [1] * num_rows
+    data['Application_Record_Count'] = np.ones(num_rows, dtype=int)
+    
+    stage_timer.lap('metrics')
     
-    # Create DataFrame
+    # Create DataFrame, with dimensions converted to categoricals first so their
+    # values never exist as one string object per row
+    for column, dtype in COLUMN_DTYPES.items():
+        if dtype == 'category':
+            data[column] = pd.Categorical(data[column])
     df = pd.DataFrame(data)
     
     # Add realistic outliers for recent applications (last 30 days)
     recent_cutoff = end_date - timedelta(days=30)
-    recent_mask = df['Event_Timestamp_UTC'] >= recent_cutoff
-    recent_indices = df[recent_mask].index
+    recent_indices = np.flatnonzero(event_timestamps >= np.datetime64(recent_cutoff))
     
     if len(recent_indices) > 0:
         # Select outlier indices
         outlier_count = int(len(recent_indices) * outlier_fraction)
         outlier_indices = np.random.choice(recent_indices, size=outlier_count, replace=False)
         
-        # Apply outliers to loan amounts and property valuations
-        for idx in outlier_indices:
-            if np.random.random() < 0.5:  # High-value outlier
-                df.at[idx, 'Loan_Amount_Requested_AUD'] *= np.random.uniform(2.0, 4.0)
-                df.at[idx, 'Property_Valuation_AUD'] *= np.random.uniform(2.0, 4.0)
-            else:  # Processing time outlier
-                if df.at[idx, 'Application_Processing_Time_To_Decision_Days'] is not None:
-                    df.at[idx, 'Application_Processing_Time_To_Decision_Days'] *= np.random.randint(2, 5)
+        # Half are high-value outliers, the rest processing time outliers
+        high_value = np.random.random(outlier_count) < 0.5
+        value_indices = outlier_indices[high_value]
+        processing_indices = outlier_indices[~high_value]
+        
+        df.loc[value_indices, 'Loan_Amount_Requested_AUD'] *= np.random.uniform(2.0, 4.0, len(value_indices))
+        df.loc[value_indices, 'Property_Valuation_AUD'] *= np.random.uniform(2.0, 4.0, len(value_indices))
+        # Applications without a decision keep a missing processing time
+        df.loc[processing_indices, 'Application_Processing_Time_To_Decision_Days'] *= np.random.randint(2, 5, len(processing_indices))
+    
+    stage_timer.lap('scenarios')
     
     # Format dates for output
-    df['Event_Date'] = pd.to_datetime(df['Event_Date']).dt.strftime('%d/%m/%Y')
-    df['Decision_Date'] = pd.to_datetime(df['Decision_Date']).dt.strftime('%d/%m/%Y')
-    df['Settlement_Date'] = pd.to_datetime(df['Settlement_Date']).dt.strftime('%d/%m/%Y')
-    df['Event_Timestamp_UTC'] = pd.to_datetime(df['Event_Timestamp_UTC']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    df['Event_Date'] = format_datetimes(event_days, '%d/%m/%Y')
+    df['Decision_Date'] = format_datetimes(decision_dates, '%d/%m/%Y')
+    df['Settlement_Date'] = format_datetimes(settlement_dates, '%d/%m/%Y')
+    df['Event_Timestamp_UTC'] = np.char.replace(np.datetime_as_string(event_timestamps, unit='s'), 'T', ' ').astype(object)
     
-    print(f"Dataset generation complete! Generated {len(df):,} loan application records.")
-    print(f"Approval rate: {df['Is_Approved_Application_Flag'].mean():.1%}")
-    print(f"Settlement rate: {df['Is_Settled_Application_Flag'].mean():.1%}")
-    print(f"Online application rate: {df['Is_Online_Application_Flag'].mean():.1%}")
+    df = df.astype(COLUMN_DTYPES)
+    stage_timer.lap('formatting')
+    
+    log(f"Dataset generation complete! Generated {len(df):,} loan application records.")
+    log(f"Approval rate: {df['Is_Approved_Application_Flag'].mean():.1%}")
+    log(f"Settlement rate: {df['Is_Settled_Application_Flag'].mean():.1%}")
+    log(f"Online application rate: {df['Is_Online_Application_Flag'].mean():.1%}")
     
     return df
 
-# Generate the loan application dataset
-loan_dataset = generate_loan_application_dataset(num_rows=150000, outlier_fraction=0.02)
+def generate_shard(num_rows, seed, row_offset, outlier_fraction=0.02):
+    """One independent shard, see sharding.generate_sharded
+
+    The 30-day outlier window is fixed to the dataset end date, so every shard
+    applies it the same way; row_offset keeps Application IDs unique across shards.
+    """
+    return generate_loan_application_dataset(num_rows, outlier_fraction, seed=seed,
+                                             id_offset=row_offset, verbose=False)
+
+if __name__ == "__main__":
+    if SHARD_ROWS:
+        from sharding import generate_sharded, generate_streamed
+        if SHARD_SINGLE_FILE:
+            generate_streamed(generate_shard, NUM_ROWS, 'bendigo_adelaide_bank_loan_applications',
+                              shard_rows=SHARD_ROWS, seed=42, workers=SHARD_WORKERS,
+                              formats=SHARD_FORMATS, table='HomeLoans')
+        else:
+            generate_sharded(generate_shard, NUM_ROWS, SHARD_OUTPUT_DIR, 'bendigo_adelaide_bank_loan_applications',
+                             shard_rows=SHARD_ROWS, seed=42, workers=SHARD_WORKERS,
+                             formats=SHARD_FORMATS, table='HomeLoans')
+    else:
+        # Generate the loan application dataset
+        loan_dataset = generate_loan_application_dataset(num_rows=NUM_ROWS, outlier_fraction=0.02)
 
-# Display sample of the dataset
-print("\nSample of generated data:")
-print(loan_dataset.head(10))
+        # Display sample of the dataset
+        print("\nSample of generated data:")
+        print(loan_dataset.head(10))
 
-print(f"\nDataset shape: {loan_dataset.shape}")
-print(f"Columns: {list(loan_dataset.columns)}")
+        print(f"\nDataset shape: {loan_dataset.shape}")
+        print(f"Columns: {list(loan_dataset.columns)}")
 
-# Save to CSV file
-csv_filename = 'bendigo_adelaide_bank_loan_applications.csv'
-hyper_filename = 'bendigo_adelaide_bank_loan_applications.hyper'
-loan_dataset.to_csv(csv_filename, index=False)
-pantab.frame_to_hyper(loan_dataset, hyper_filename, table='HomeLoans')
-print(f"\nDataset saved as '{csv_filename}' and '{hyper_filename}")
+        # Save to CSV and Hyper files in a single pass
+        csv_filename = 'bendigo_adelaide_bank_loan_applications.csv'
+        hyper_filename = 'bendigo_adelaide_bank_loan_applications.hyper'
+        write_frame(loan_dataset, {'csv': csv_filename, 'hyper': hyper_filename}, table='HomeLoans')
+        print(f"\nDataset saved as '{csv_filename}' and '{hyper_filename}")
 
-# Download the file
-# files.download(csv_filename)
+        # Download the file (Colab only)
+        # from google.colab import files
+        # files.download(csv_filename)
 
-# Display summary statistics
-print("\nSummary Statistics:")
-print(f"Total Applications: {len(loan_dataset):,}")
-print(f"Unique Customers: {loan_dataset['Customer_ID'].nunique():,}")
-print(f"Date Range: {loan_dataset['Event_Date'].min()} to {loan_dataset['Event_Date'].max()}")
-print(f"Average Loan Amount Requested: ${loan_dataset['Loan_Amount_Requested_AUD'].mean():,.2f}")
-print(f"Average Property Valuation: ${loan_dataset['Property_Valuation_AUD'].mean():,.2f}")
-print(f"Average Credit Score: {loan_dataset['Customer_Credit_Score'].mean():.0f}")
+        # Display summary statistics
+        print("\nSummary Statistics:")
+        print(f"Total Applications: {len(loan_dataset):,}")
+        print(f"Unique Customers: {loan_dataset['Customer_ID'].nunique():,}")
+        print(f"Date Range: {loan_dataset['Event_Date'].min()} to {loan_dataset['Event_Date'].max()}")
+        print(f"Average Loan Amount Requested: ${loan_dataset['Loan_Amount_Requested_AUD'].mean():,.2f}")
+        print(f"Average Property Valuation: ${loan_dataset['Property_Valuation_AUD'].mean():,.2f}")
+        print(f"Average Credit Score: {loan_dataset['Customer_Credit_Score'].mean():.0f}")
 
-# Show distribution by key dimensions
-print(f"\nTop 5 States by Application Volume:")
-print(loan_dataset['Property_State'].value_counts().head())
+        # Show distribution by key dimensions
+        print(f"\nTop 5 States by Application Volume:")
+        print(loan_dataset['Property_State'].value_counts().head())
 
-print(f"\nTop 5 Loan Types:")
-print(loan_dataset['Loan_Type'].value_counts().head())
+        print(f"\nTop 5 Loan Types:")
+        print(loan_dataset['Loan_Type'].value_counts().head())
 
-print(f"\nApplication Channel Distribution:")
-print(loan_dataset['Application_Channel'].value_counts())
+        print(f"\nApplication Channel Distribution:")
+        print(loan_dataset['Application_Channel'].value_counts())
@@ -0,0 +1,128 @@
+# The Hyper writer of "BigQuery to Hyper v2.5.ipynb": Hyper loads Parquet files itself.
+#
+#     with HyperWriter('extract.hyper', table='Extract') as writer:
+#         writer.insert_files_parallel(parquet_files, workers=4)
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from tableauhyperapi import (
+    HyperProcess, Connection, Telemetry, CreateMode, TableName, HyperException, escape_name, escape_string_literal
+)
+
+
+class HyperWriter:
+    """One Hyper process and connection for a whole run, loading Parquet chunks into one table.
+
+    Hyper reads the Parquet files itself (external()), so the rows never pass through
+    pandas and the hyper file is opened once instead of once per batch.
+    """
+    def __init__(self, database: str, table: str = 'Extract', replace: bool = True):
+        self.database = str(database)
+        # Fully qualified, so the name stays unambiguous while part databases are attached
+        self.table = TableName('output', 'public', table)
+        self.replace = replace
+        self.created = False
+
+    def __enter__(self):
+        self.process = HyperProcess(telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU)
+        self.connection = Connection(self.process.endpoint)
+        if self.replace or not os.path.exists(self.database):
+            self.connection.catalog.drop_database_if_exists(self.database)
+            self.connection.catalog.create_database(self.database)
+        self.connection.catalog.attach_database(self.database, alias='output')
+        # A table left over from an interrupted run is loaded again from scratch
+        self.connection.execute_command(f"DROP TABLE IF EXISTS {self.table}")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+        self.process.close()
+
+    @staticmethod
+    def _external(files: List[Path]) -> str:
+        paths = ', '.join(escape_string_literal(str(Path(file).resolve())) for file in files)
+        return f"external(ARRAY[{paths}], FORMAT => 'parquet')"
+
+    def _load(self, connection: Connection, table: TableName, source: str, create: bool):
+        # The first load creates the table with the columns of the source
+        if create:
+            connection.execute_command(f"CREATE TABLE {table} AS (SELECT * FROM {source})")
+        else:
+            connection.execute_command(f"INSERT INTO {table} SELECT * FROM {source}")
+
+    def insert_files(self, files: List[Path]):
+        """Append Parquet files to the table with one INSERT ... SELECT"""
+        self._load(self.connection, self.table, self._external(files), create=not self.created)
+        self.created = True
+
+    def insert_files_parallel(self, files: List[Path], workers: int):
+        """Load files into one temporary database per worker in parallel, then merge them with one INSERT ... SELECT"""
+        size = -(-len(files) // workers)
+        parts = [files[i:i + size] for i in range(0, len(files), size)]
+        part_databases = [f"{self.database}.part{i}.hyper" for i in range(len(parts))]
+
+        def load_part(part_database: str, part: List[Path]):
+            # Each worker has its own connection to the shared Hyper process
+            with Connection(self.process.endpoint, part_database, CreateMode.CREATE_AND_REPLACE) as connection:
+                self._load(connection, TableName('public', self.table.name), self._external(part), create=True)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(parts) or 1) as executor:
+                list(executor.map(load_part, part_databases, parts))
+
+            # Parts are contiguous runs of the files, so UNION ALL keeps the chunk order
+            selects = []
+            for i, part_database in enumerate(part_databases):
+                self.connection.catalog.attach_database(part_database, alias=f"part{i}")
+                selects.append(f"SELECT * FROM {TableName(f'part{i}', 'public', self.table.name)}")
+            self._load(self.connection, self.table, f"({' UNION ALL '.join(selects)}) AS parts", create=not self.created)
+            self.created = True
+        finally:
+            for i, part_database in enumerate(part_databases):
+                try:
+                    self.connection.catalog.detach_database(f"part{i}")
+                except HyperException:
+                    pass
+                if os.path.exists(part_database):
+                    os.remove(part_database)
+
+    def row_count(self) -> int:
+        if not self.created:
+            return 0
+        return self.connection.execute_scalar_query(f"SELECT COUNT(*) FROM {self.table}")
+
+    def merge_into(self, table: str, keys: Optional[List[str]] = None, newest: Optional[str] = None) -> int:
+        """Move the loaded rows into another table of the file in one transaction, returns the rows replaced
+
+        With keys, rows of the other table with the same keys are deleted first (an upsert),
+        and of loaded rows sharing keys only the one with the highest newest column is kept.
+        """
+        target = TableName('output', 'public', table)
+        replaced = 0
+        rows = f"SELECT * FROM {self.table}"
+        self.connection.execute_command("BEGIN TRANSACTION")
+        try:
+            if keys:
+                match = ' AND '.join(f"{self.table}.{escape_name(key)} = {target}.{escape_name(key)}" for key in keys)
+                replaced = self.connection.execute_command(
+                    f"DELETE FROM {target} WHERE EXISTS (SELECT 1 FROM {self.table} WHERE {match})"
+                )
+                if newest:
+                    # A key updated more than once since the last run has a row per version
+                    columns = ', '.join(str(column.name) for column in
+                                        self.connection.catalog.get_table_definition(self.table).columns)
+                    partition = ', '.join(escape_name(key) for key in keys)
+                    rows = (f"SELECT {columns} FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} "
+                            f"ORDER BY {escape_name(newest)} DESC) AS \"merge_version\" "
+                            f"FROM {self.table}) AS versions WHERE \"merge_version\" = 1")
+            self.connection.execute_command(f"INSERT INTO {target} {rows}")
+            self.connection.execute_command("COMMIT")
+        except Exception:
+            self.connection.execute_command("ROLLBACK")
+            raise
+        # Hyper doesn't mix DDL and DML in one transaction
+        self.connection.execute_command(f"DROP TABLE {self.table}")
+        self.created = False
+        return replaced
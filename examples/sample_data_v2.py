@@ -2,30 +2,65 @@
 # - All customer/account manager labels and regions are synthetic.
 # - No real organisation, person, or location names are used.
 
+import importlib.util
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import uuid
 import warnings
 warnings.filterwarnings('ignore')
 
-# Try importing pantab for Hyper export, fallback if unavailable
-try:
-    import pantab
-    PANTAB_AVAILABLE = True
-except ImportError:
+import stage_timer
+from columnar import random_uuids, choice_categorical, code_labels, week_starts, month_starts, format_datetimes
+from export import write_frame
+from scenarios import apply_scenarios
+
+# The Hyper export (export.write_frame) needs pantab - install it if missing, fallback if unavailable
+PANTAB_AVAILABLE = importlib.util.find_spec('pantab') is not None
+if not PANTAB_AVAILABLE:
     try:
         import subprocess
         import sys
         subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-q', 'pantab', 'pyarrow'])
-        import pantab
         PANTAB_AVAILABLE = True
     except Exception:
-        PANTAB_AVAILABLE = False
         print("# Pantab unavailable - will skip Hyper export")
 
 # Set global random seed for reproducibility
-np.random.seed(42)
+RANDOM_SEED = 42
+np.random.seed(RANDOM_SEED)
+
+NUM_ROWS = 150_000
+
+# By default all NUM_ROWS rows are built in one DataFrame before they are written,
+# so memory grows with NUM_ROWS; for large NUM_ROWS use sharded mode.
+#
+# Sharded mode - set SHARD_ROWS to generate NUM_ROWS as independent seeded shards
+# in parallel, each written straight to its own part files under SHARD_OUTPUT_DIR
+SHARD_ROWS = None
+SHARD_WORKERS = None  # defaults to the number of cores
+SHARD_FORMATS = ('parquet',)  # any of 'parquet', 'hyper', 'csv'
+SHARD_OUTPUT_DIR = 'customer_analytics_pulse_parts'
+SHARD_SINGLE_FILE = False  # stream the shards, in order, into one file per format instead
+
+# Compact output types - dimensions are generated as categoricals, rates and
+# scores are float32 (7 significant digits), currency amounts stay float64
+COLUMN_DTYPES = {
+    'customer_sk': 'int16',
+    'site_sk': 'int16',
+    'case_mttr_hours': 'float32',
+    'first_contact_resolution_rate': 'float32',
+    'anomaly_detection_precision': 'float32',
+    'anomaly_detection_recall': 'float32',
+    'proactive_notification_rate': 'float32',
+    'data_completeness_rate': 'float32',
+    'notification_timeliness_minutes': 'float32',
+    'customer_satisfaction_score': 'float32',
+    'false_positive_rate': 'float32',
+    'billing_correction_accuracy': 'float32',
+    'total_cases_opened': 'int16',
+    'total_alerts_generated': 'int16',
+    'critical_cases_count': 'int16',
+}
 
 # Scenario configuration constants (synthetic segments/regions)
 SCENARIO_CONFIG = {
@@ -56,8 +91,53 @@ EXECUTIVE_SUMMARY = {
     ]
 }
 
-def generate_customer_analytics_data():
-    """Generate 150,000 rows of synthetic customer analytics data (PII-removed)."""
+def scenario_specs(spike_cutoff, degradation_cutoff, outlier_cutoff):
+    """SCENARIO_CONFIG as spike, degradation and outlier specs for scenarios.apply_scenarios"""
+    specs = []
+
+    # Scenario 1: Performance spike in Manufacturing (last 90 days)
+    if SCENARIO_CONFIG['enable_performance_spike']:
+        specs.append({
+            'name': 'performance spike',
+            'since': spike_cutoff,
+            'where': {'industry': SCENARIO_CONFIG['affected_segment']},
+            # ~2.0–3.0x spike on MTTR, correlated decrease in first contact resolution
+            'scale': {'case_mttr_hours': (2.0, 3.0), 'first_contact_resolution_rate': (0.6, 0.8)},
+        })
+
+    # Scenario 2: Gradual degradation in Region B (6 months)
+    if SCENARIO_CONFIG['enable_degradation']:
+        specs.append({
+            'name': 'degradation',
+            'since': degradation_cutoff,
+            'where': {'region': SCENARIO_CONFIG['degradation_dimension']},
+            # Gradual decline in data completeness, correlated increase in false positives
+            'scale': {'data_completeness_rate': (0.7, 0.9), 'false_positive_rate': (1.5, 2.5)},
+        })
+
+    # Scenario 3: ~2% outliers concentrated in recent 20% of timeframe,
+    # split evenly between MTTR spikes, savings spikes and satisfaction drops
+    specs.append({
+        'name': 'recent outliers',
+        'since': outlier_cutoff,
+        'fraction': 0.02,
+        'groups': [
+            {'share': 1, 'scale': {'case_mttr_hours': (5, 10)}},
+            {'share': 1, 'scale': {'tariff_optimisation_savings_aud': (3, 8)}},
+            {'share': 1, 'scale': {'customer_satisfaction_score': (0.3, 0.6)}},
+        ],
+    })
+    return specs
+
+def generate_customer_analytics_data(total_rows=NUM_ROWS, seed=None, verbose=True):
+    """Generate total_rows of synthetic customer analytics data (PII-removed).
+
+    Scenario cutoffs hang off the fixed reference date, so independently seeded
+    shards apply the same spike, degradation and outlier windows.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    log = print if verbose else (lambda *args: None)
 
     # Reference date (example); can be replaced with a timezone-aware datetime if desired
     reference_date = datetime(2025, 8, 21, 11, 28, 26)
@@ -66,70 +146,68 @@ def generate_customer_analytics_data():
     start_date = reference_date - timedelta(days=750)
     recent_cutoff = reference_date - timedelta(days=180)
 
-    print("Generating synthetic customer analytics monitoring data...")
-    print(f"Date range: {start_date.strftime('%Y-%m-%d')} to {reference_date.strftime('%Y-%m-%d')}")
+    log("Generating synthetic customer analytics monitoring data...")
+    log(f"Date range: {start_date.strftime('%Y-%m-%d')} to {reference_date.strftime('%Y-%m-%d')}")
 
     # Generate weighted timestamps - 60% in recent 6 months
-    total_rows = 150_000
     recent_count = int(total_rows * 0.6)
     historical_count = total_rows - recent_count
 
-    # Recent timestamps (last 6 months)
+    # Day offsets: recent (last 6 months) then historical (older than 6 months)
     recent_days = (reference_date - recent_cutoff).days
-    recent_random_days = np.random.randint(0, recent_days, recent_count)
-    recent_timestamps = [
-        recent_cutoff + timedelta(days=int(d), hours=np.random.randint(0, 24), minutes=np.random.randint(0, 60))
-        for d in recent_random_days
-    ]
-
-    # Historical timestamps (older than 6 months)
     historical_days = (recent_cutoff - start_date).days
-    historical_random_days = np.random.randint(0, historical_days, historical_count)
-    historical_timestamps = [
-        start_date + timedelta(days=int(d), hours=np.random.randint(0, 24), minutes=np.random.randint(0, 60))
-        for d in historical_random_days
-    ]
+    starts = np.repeat(np.array([recent_cutoff, start_date], dtype='datetime64[s]'), [recent_count, historical_count])
+    day_offsets = np.concatenate([
+        np.random.randint(0, recent_days, recent_count),
+        np.random.randint(0, historical_days, historical_count),
+    ])
+    second_offsets = day_offsets * 86400 + np.random.randint(0, 24, total_rows) * 3600 + np.random.randint(0, 60, total_rows) * 60
 
     # Combine and shuffle
-    all_timestamps = recent_timestamps + historical_timestamps
+    all_timestamps = starts + second_offsets.astype('timedelta64[s]')
     np.random.shuffle(all_timestamps)
+    all_days = all_timestamps.astype('datetime64[D]')
+    stage_timer.lap('dates')
 
     # Base data dict
     data = {}
 
     # Row identifiers
-    data['row_id'] = [str(uuid.uuid4()) for _ in range(total_rows)]
+    data['row_id'] = random_uuids(total_rows)
     data['as_of'] = all_timestamps
+    stage_timer.lap('ids')
 
     # Derive time dimensions
-    data['date'] = [ts.date() for ts in all_timestamps]
-    data['week_start'] = [ts.date() - timedelta(days=ts.weekday()) for ts in all_timestamps]
-    data['month_start'] = [ts.date().replace(day=1) for ts in all_timestamps]
+    data['date'] = all_days
+    data['week_start'] = week_starts(all_days)
+    data['month_start'] = month_starts(all_days)
+    stage_timer.lap('dates')
 
     # Synthetic customer labels (no real names)
     # 50 synthetic customers: "Customer 001" ... "Customer 050"
-    customer_labels = [f'Customer {i:03d}' for i in range(1, 51)]
     data['customer_sk'] = np.random.randint(1, 51, total_rows)
-    data['customer_id'] = [f'CUST{str(sk).zfill(3)}' for sk in data['customer_sk']]
-    data['customer_label'] = [customer_labels[sk - 1] for sk in data['customer_sk']]
+    data['customer_id'] = code_labels(data['customer_sk'], 'CUST{:03d}')
+    data['customer_label'] = code_labels(data['customer_sk'], 'Customer {:03d}')
 
     # Synthetic site labels (200 sites): "Site 001" ... "Site 200"
     data['site_sk'] = np.random.randint(1, 201, total_rows)
-    data['site_id'] = [f'SITE{str(sk).zfill(3)}' for sk in data['site_sk']]
+    data['site_id'] = code_labels(data['site_sk'], 'SITE{:03d}')
 
     # Synthetic regions
     regions = ['Region A', 'Region B', 'Region C', 'Region D']
     region_weights = [0.45, 0.25, 0.20, 0.10]
-    data['region'] = np.random.choice(regions, total_rows, p=region_weights)
+    data['region'] = choice_categorical(regions, total_rows, p=region_weights)
 
     # Industries (generic)
     industries = ['Manufacturing', 'Healthcare', 'Education', 'Logistics', 'Other']
     industry_weights = [0.40, 0.15, 0.15, 0.15, 0.15]
-    data['industry'] = np.random.choice(industries, total_rows, p=industry_weights)
+    data['industry'] = choice_categorical(industries, total_rows, p=industry_weights)
 
     # Synthetic account managers (no personal names)
     managers = [f'AM-{i:03d}' for i in range(1, 13)]  # AM-001 ... AM-012
-    data['account_manager'] = np.random.choice(managers, total_rows)
+    data['account_manager'] = choice_categorical(managers, total_rows)
+
+    stage_timer.lap('dimensions')
 
     # KPI measures with realistic distributions and correlations
 
@@ -172,69 +250,42 @@ def generate_customer_analytics_data():
     data['total_alerts_generated'] = np.random.poisson(25, total_rows) + 5
     data['critical_cases_count'] = np.random.poisson(2.5, total_rows)
 
+    stage_timer.lap('metrics')
+
     # Build DataFrame
     df = pd.DataFrame(data)
 
-    # Scenario 1: Performance spike in Manufacturing (last 90 days)
+    # Scenario cutoffs
     spike_cutoff = reference_date - timedelta(days=SCENARIO_CONFIG['spike_period_days'])
-    spike_mask = (df['as_of'] >= spike_cutoff) & (df['industry'] == SCENARIO_CONFIG['affected_segment'])
-    spike_indices = df.index[spike_mask]
-
-    if len(spike_indices) > 0:
-        # ~2.0–3.0x spike on MTTR
-        df.loc[spike_indices, 'case_mttr_hours'] *= np.random.uniform(2.0, 3.0, len(spike_indices))
-        # Correlated decrease in first contact resolution
-        df.loc[spike_indices, 'first_contact_resolution_rate'] *= np.random.uniform(0.6, 0.8, len(spike_indices))
-        print(f"Applied performance spike to {len(spike_indices)} Manufacturing records")
-
-    # Scenario 2: Gradual degradation in Region B (6 months)
     degradation_cutoff = reference_date - timedelta(days=SCENARIO_CONFIG['degradation_duration_months'] * 30)
-    degradation_mask = (df['as_of'] >= degradation_cutoff) & (df['region'] == SCENARIO_CONFIG['degradation_dimension'])
-    degradation_indices = df.index[degradation_mask]
-
-    if len(degradation_indices) > 0:
-        # Gradual decline in data completeness
-        degradation_factor = np.random.uniform(0.7, 0.9, len(degradation_indices))
-        df.loc[degradation_indices, 'data_completeness_rate'] *= degradation_factor
-        # Correlated increase in false positives
-        df.loc[degradation_indices, 'false_positive_rate'] *= np.random.uniform(1.5, 2.5, len(degradation_indices))
-        print(f"Applied degradation pattern to {len(degradation_indices)} records in Region B")
-
-    # Scenario 3: Outlier concentration in recent 20% of timeframe
     outlier_cutoff = reference_date - timedelta(days=int(750 * 0.2))  # Recent ~20%
-    outlier_mask = df['as_of'] >= outlier_cutoff
-    outlier_indices = df.index[outlier_mask]
-
-    # Select ~2% outliers from the recent period, but only if available
-    outlier_sample_size = int(len(outlier_indices) * 0.02)
-    if outlier_sample_size > 0:
-        selected_outlier_indices = np.random.choice(outlier_indices, outlier_sample_size, replace=False)
-
-        # Apply various outlier patterns
-        for idx in selected_outlier_indices:
-            outlier_type = np.random.choice(['mttr_spike', 'savings_spike', 'satisfaction_drop'])
-            if outlier_type == 'mttr_spike':
-                df.at[idx, 'case_mttr_hours'] *= np.random.uniform(5, 10)
-            elif outlier_type == 'savings_spike':
-                df.at[idx, 'tariff_optimisation_savings_aud'] *= np.random.uniform(3, 8)
-            elif outlier_type == 'satisfaction_drop':
-                df.at[idx, 'customer_satisfaction_score'] *= np.random.uniform(0.3, 0.6)
-
-        print(f"Applied outlier patterns to {outlier_sample_size} recent records")
+
+    affected = apply_scenarios(df, scenario_specs(spike_cutoff, degradation_cutoff, outlier_cutoff), 'as_of')
+    if affected.get('performance spike'):
+        log(f"Applied performance spike to {affected['performance spike']} Manufacturing records")
+    if affected.get('degradation'):
+        log(f"Applied degradation pattern to {affected['degradation']} records in Region B")
+    if affected['recent outliers']:
+        log(f"Applied outlier patterns to {affected['recent outliers']} recent records")
     else:
-        print("No recent records available for outlier sampling; skipping outlier injection")
+        log("No recent records available for outlier sampling; skipping outlier injection")
+
+    stage_timer.lap('scenarios')
 
     # AU-formatted date strings for export
-    df['date_formatted'] = pd.to_datetime(df['date']).dt.strftime('%d/%m/%Y')
-    df['week_start_formatted'] = pd.to_datetime(df['week_start']).dt.strftime('%d/%m/%Y')
-    df['month_start_formatted'] = pd.to_datetime(df['month_start']).dt.strftime('%d/%m/%Y')
-    df['as_of_formatted'] = pd.to_datetime(df['as_of']).dt.strftime('%d/%m/%Y %H:%M:%S')
+    df['date_formatted'] = format_datetimes(all_days, '%d/%m/%Y')
+    df['week_start_formatted'] = format_datetimes(data['week_start'], '%d/%m/%Y')
+    df['month_start_formatted'] = format_datetimes(data['month_start'], '%d/%m/%Y')
+    df['as_of_formatted'] = format_datetimes(all_timestamps, '%d/%m/%Y %H:%M:%S')
+
+    df = df.astype(COLUMN_DTYPES)
+    stage_timer.lap('formatting')
 
     # Validation checks
-    print(f"\nValidation Results:")
-    print(f"✓ Row count: {len(df)} (target: 150,000)")
-    print(f"✓ Date coverage: {df['date'].min()} to {df['date'].max()}")
-    print(f"✓ Recent 6 months: {(df['as_of'] >= recent_cutoff).sum() / len(df):.1%}")
+    log(f"\nValidation Results:")
+    log(f"✓ Row count: {len(df)} (target: {total_rows:,})")
+    log(f"✓ Date coverage: {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}")
+    log(f"✓ Recent 6 months: {(df['as_of'] >= recent_cutoff).sum() / len(df):.1%}")
 
     # Validate spike pattern
     recent_90_manufacturing = df[(df['as_of'] >= spike_cutoff) & (df['industry'] == SCENARIO_CONFIG['affected_segment'])]
@@ -244,9 +295,9 @@ def generate_customer_analytics_data():
         recent_mttr_mean = recent_90_manufacturing['case_mttr_hours'].mean()
         historical_mttr_mean = historical_manufacturing['case_mttr_hours'].mean()
         spike_ratio = recent_mttr_mean / max(historical_mttr_mean, 1e-9)
-        print(f"✓ Manufacturing MTTR spike ratio: {spike_ratio:.1f}x (target: ≥2.0x)")
+        log(f"✓ Manufacturing MTTR spike ratio: {spike_ratio:.1f}x (target: ≥2.0x)")
         if spike_ratio < 2.0:
-            print("⚠ Warning: Spike pattern may be insufficient")
+            log("⚠ Warning: Spike pattern may be insufficient")
 
     # Validate degradation pattern
     recent_deg = df[(df['as_of'] >= degradation_cutoff) & (df['region'] == SCENARIO_CONFIG['degradation_dimension'])]
@@ -256,17 +307,15 @@ def generate_customer_analytics_data():
         recent_completeness = recent_deg['data_completeness_rate'].mean()
         historical_completeness = historical_deg['data_completeness_rate'].mean()
         degradation_ratio = recent_completeness / max(historical_completeness, 1e-9)
-        print(f"✓ Region B completeness ratio: {degradation_ratio:.2f} (target: ≤0.8)")
+        log(f"✓ Region B completeness ratio: {degradation_ratio:.2f} (target: ≤0.8)")
         if degradation_ratio > 0.8:
-            print("⚠ Warning: Degradation pattern may be insufficient")
+            log("⚠ Warning: Degradation pattern may be insufficient")
 
+    stage_timer.lap('validation')
     return df
 
-def export_data(df):
-    """Export data to CSV and Hyper formats"""
-    timestamp_suffix = datetime.now().strftime('%Y%m%d_%H%M%S')
-
-    # Prepare export DataFrame with Australian date formatting
+def export_frame(df):
+    """Prepare export DataFrame with Australian date formatting"""
     export_df = df.copy()
 
     # Use formatted dates for export
@@ -276,23 +325,31 @@ def export_data(df):
     export_df['as_of'] = export_df['as_of_formatted']
 
     # Drop temporary formatted columns
-    export_df = export_df.drop(columns=['date_formatted', 'week_start_formatted',
-                                       'month_start_formatted', 'as_of_formatted'])
+    return export_df.drop(columns=['date_formatted', 'week_start_formatted',
+                                   'month_start_formatted', 'as_of_formatted'])
 
-    # CSV export
-    csv_filename = f'customer_analytics_pulse_{timestamp_suffix}.csv'
-    export_df.to_csv(csv_filename, index=False)
-    print(f"✓ CSV export complete: {csv_filename}")
+def generate_shard(num_rows, seed, row_offset):
+    """One independent, export-ready shard, see sharding.generate_sharded"""
+    return export_frame(generate_customer_analytics_data(num_rows, seed=seed, verbose=False))
 
-    # Hyper export
+def export_data(df):
+    """Export data to CSV and Hyper formats"""
+    timestamp_suffix = datetime.now().strftime('%Y%m%d_%H%M%S')
+    export_df = export_frame(df)
+
+    # CSV and Hyper export in a single pass
+    csv_filename = f'customer_analytics_pulse_{timestamp_suffix}.csv'
+    hyper_filename = f'customer_analytics_pulse_{timestamp_suffix}.hyper'
     if PANTAB_AVAILABLE:
         try:
-            hyper_filename = f'customer_analytics_pulse_{timestamp_suffix}.hyper'
-            pantab.frame_to_hyper(export_df, hyper_filename, table='CustomerAnalytics')
+            write_frame(export_df, {'csv': csv_filename, 'hyper': hyper_filename}, table='CustomerAnalytics')
+            print(f"✓ CSV export complete: {csv_filename}")
             print(f"✓ Hyper export complete: {hyper_filename}")
-        except Exception as e:
-            print(f"⚠ Hyper export failed: {e}")
+        except RuntimeError as e:
+            print(f"⚠ Export failed: {e}")
     else:
+        write_frame(export_df, {'csv': csv_filename}, table='CustomerAnalytics')
+        print(f"✓ CSV export complete: {csv_filename}")
         print("⚠ Hyper export skipped - pantab not available")
 
     return csv_filename
@@ -301,15 +358,16 @@ def main():
     """Main execution function"""
     print("Synthetic Customer Analytics Data Generation (PII-Removed)")
     print("=" * 60)
-    print(f"Target: 150,000 records")
+    print(f"Target: {NUM_ROWS:,} records")
     print(f"Scenario: {EXECUTIVE_SUMMARY['primary_insight']}")
     print()
 
     # Generate data
-    df = generate_customer_analytics_data()
+    df = generate_customer_analytics_data(NUM_ROWS)
 
     # Export files
     csv_file = export_data(df)
+    stage_timer.lap('export')
 
     # Final validation and summary
     print("\n" + "=" * 60)
@@ -317,7 +375,7 @@ def main():
     print("=" * 60)
 
     # Acceptance tests
-    assert len(df) == 150000, f"Row count validation failed: {len(df)} != 150000"
+    assert len(df) == NUM_ROWS, f"Row count validation failed: {len(df)} != {NUM_ROWS}"
 
     required_columns = ['row_id', 'as_of', 'date', 'customer_sk', 'case_mttr_hours']
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -331,6 +389,7 @@ def main():
     assert recent_pct >= 0.55, f"Recent data percentage too low: {recent_pct:.1%} < 55%"
 
     print("✓ All acceptance tests passed")
+    stage_timer.lap('validation')
 
     # Executive insights
     print(f"\nKey Insights for Tableau Pulse:")
@@ -342,4 +401,15 @@ def main():
     return df
 
 if __name__ == "__main__":
-    df = main()
+    if SHARD_ROWS:
+        from sharding import generate_sharded, generate_streamed
+        if SHARD_SINGLE_FILE:
+            generate_streamed(generate_shard, NUM_ROWS, 'customer_analytics_pulse',
+                              shard_rows=SHARD_ROWS, seed=RANDOM_SEED, workers=SHARD_WORKERS,
+                              formats=SHARD_FORMATS, table='CustomerAnalytics')
+        else:
+            generate_sharded(generate_shard, NUM_ROWS, SHARD_OUTPUT_DIR, 'customer_analytics_pulse',
+                             shard_rows=SHARD_ROWS, seed=RANDOM_SEED, workers=SHARD_WORKERS,
+                             formats=SHARD_FORMATS, table='CustomerAnalytics')
+    else:
+        df = main()
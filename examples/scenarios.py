@@ -0,0 +1,61 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# A scenario spec is a dict:
+#   'name':     label used in the returned counts
+#   'since':    only rows whose date column is >= this date (optional)
+#   'where':    {column: value or list of values} row filters (optional)
+#   'fraction': sample this fraction of the matching rows, e.g. outliers (optional)
+#   'scale':    {column: factor or (low, high)} - a (low, high) range draws one
+#               uniform factor per row
+#   'groups':   instead of 'scale', split the rows by 'share' into groups that
+#               each have their own 'scale', e.g. positive and negative outliers;
+#               used with 'fraction', whose sampled rows come in random order
+
+
+def scenario_rows(df: pd.DataFrame, spec: Dict, date_column: str) -> np.ndarray:
+    """Positions of the rows a scenario applies to"""
+    mask = np.ones(len(df), dtype=bool)
+    if spec.get('since') is not None:
+        mask &= (df[date_column] >= spec['since']).to_numpy()
+    for column, value in spec.get('where', {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= df[column].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def _scale(df: pd.DataFrame, rows: np.ndarray, scale: Dict, rng) -> None:
+    for column, factor in scale.items():
+        if isinstance(factor, tuple):
+            factor = rng.uniform(factor[0], factor[1], len(rows))
+        values = df[column].to_numpy()
+        updated = values.astype(np.result_type(values, factor), copy=True)
+        updated[rows] *= factor
+        df[column] = updated
+
+
+def apply_scenarios(df: pd.DataFrame, scenarios: List[Dict], date_column: str, rng=np.random) -> Dict[str, int]:
+    """Apply scenario specs to df in place as masked array updates, returns rows affected per scenario
+
+    rng defaults to the global numpy random state, so the generators' seeds still apply.
+    """
+    affected = {}
+    for spec in scenarios:
+        rows = scenario_rows(df, spec, date_column)
+        if 'fraction' in spec:
+            rows = rng.choice(rows, int(len(rows) * spec['fraction']), replace=False)
+        groups = spec.get('groups') or [{'share': 1.0, 'scale': spec['scale']}]
+
+        # Contiguous slices of the sampled rows are random groups
+        shares = np.cumsum([group['share'] for group in groups])
+        bounds = np.round(shares / shares[-1] * len(rows)).astype(int)
+        start = 0
+        for group, end in zip(groups, bounds):
+            if end > start:
+                _scale(df, rows[start:end], group['scale'], rng)
+            start = end
+
+        affected[spec['name']] = len(rows)
+    return affected
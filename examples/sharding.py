@@ -0,0 +1,102 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from export import frame_batches, write_batches, write_frame
+
+
+def plan_shards(num_rows: int, shard_rows: int, seed: int) -> List[Tuple[int, int, int, int]]:
+    """Split num_rows into (index, row_offset, row_count, seed) shards with independent seeds"""
+    offsets = range(0, num_rows, shard_rows)
+    # SeedSequence gives statistically independent, reproducible child seeds
+    seeds = np.random.SeedSequence(seed).generate_state(len(offsets))
+    return [
+        (index, offset, min(shard_rows, num_rows - offset), int(shard_seed))
+        for index, (offset, shard_seed) in enumerate(zip(offsets, seeds))
+    ]
+
+
+def write_part(df: pd.DataFrame, base_path: str, formats: Sequence[str], table: str) -> List[str]:
+    """Write one shard to its part files in a single pass, returns the written paths"""
+    return write_frame(df, {file_format: f"{base_path}.{file_format}" for file_format in formats}, table=table)
+
+
+def _generate_part(task) -> Tuple[int, int, List[str]]:
+    generate_shard, kwargs, (index, row_offset, row_count, seed), base_path, formats, table = task
+    df = generate_shard(row_count, seed=seed, row_offset=row_offset, **kwargs)
+    paths = write_part(df, base_path, formats, table)
+    return index, len(df), paths
+
+
+def generate_sharded(generate_shard: Callable[..., pd.DataFrame], num_rows: int, output_dir: str,
+                     name: str, shard_rows: int = 1_000_000, seed: int = 42,
+                     workers: Optional[int] = None, formats: Sequence[str] = ('parquet',),
+                     table: str = 'Extract', shard_kwargs: Optional[Dict] = None) -> List[str]:
+    """Generate num_rows as independent seeded shards in parallel, one set of part files per shard.
+
+    generate_shard(row_count, seed=..., row_offset=..., **shard_kwargs) must build a complete,
+    export-ready shard; it has to be a module-level function so worker processes can import it.
+    Only part file paths come back to this process, so memory stays flat as num_rows grows.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shards = plan_shards(num_rows, shard_rows, seed)
+    tasks = [
+        (generate_shard, shard_kwargs or {}, shard, os.path.join(output_dir, f"{name}_part-{shard[0]:05d}"), formats, table)
+        for shard in shards
+    ]
+
+    print(f"Generating {num_rows:,} rows as {len(shards)} shards of up to {shard_rows:,} rows...")
+    part_paths = []
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for index, rows, paths in executor.map(_generate_part, tasks):
+            total_rows += rows
+            part_paths.extend(paths)
+            print(f"  shard {index + 1}/{len(shards)}: {rows:,} rows -> {', '.join(os.path.basename(p) for p in paths)}")
+
+    print(f"Sharded generation complete: {total_rows:,} rows in {output_dir}")
+    return part_paths
+
+
+def _generate_frame(task) -> pd.DataFrame:
+    generate_shard, kwargs, (index, row_offset, row_count, seed) = task
+    return generate_shard(row_count, seed=seed, row_offset=row_offset, **kwargs)
+
+
+def generate_streamed(generate_shard: Callable[..., pd.DataFrame], num_rows: int, base_path: str,
+                      shard_rows: int = 1_000_000, seed: int = 42, workers: Optional[int] = None,
+                      formats: Sequence[str] = ('parquet',), table: str = 'Extract',
+                      shard_kwargs: Optional[Dict] = None) -> List[str]:
+    """Generate the shards of generate_sharded, but stream them into one file per format.
+
+    Shards are generated in parallel and written in order through a single export.write_batches
+    pass to base_path.<format>. At most workers shards wait to be written, so memory follows
+    shard_rows and workers, not num_rows.
+    """
+    shards = plan_shards(num_rows, shard_rows, seed)
+    workers = workers or os.cpu_count()
+    paths = {file_format: f"{base_path}.{file_format}" for file_format in formats}
+
+    def frames(executor: ProcessPoolExecutor) -> Iterator[pd.DataFrame]:
+        upcoming = iter(shards)
+        pending = deque()
+        for index in range(len(shards)):
+            # Keep up to workers shards generating ahead of the writer
+            for shard in upcoming:
+                pending.append(executor.submit(_generate_frame, (generate_shard, shard_kwargs or {}, shard)))
+                if len(pending) == workers:
+                    break
+            df = pending.popleft().result()
+            print(f"  shard {index + 1}/{len(shards)}: {len(df):,} rows")
+            yield from frame_batches(df)
+
+    print(f"Generating {num_rows:,} rows as {len(shards)} shards of up to {shard_rows:,} rows "
+          f"into {', '.join(paths.values())}...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        written = write_batches(frames(executor), paths, table)
+    print(f"Streamed generation complete: {num_rows:,} rows")
+    return written
@@ -0,0 +1,64 @@
+import contextlib
+import threading
+import time
+from typing import Dict, Iterable, Iterator, TypeVar
+
+# Per-stage wall time for the benchmarks. The generators call lap(stage) at the end
+# of each stage; the time since the previous lap goes to that stage. Pipelines whose
+# stages overlap in threads time each piece of work with timed() or timed_iter()
+# instead, so a stage's time is summed across threads and can exceed the wall time.
+_timings: Dict[str, float] = {}
+_last = None
+_lock = threading.Lock()
+
+T = TypeVar('T')
+
+
+def start() -> None:
+    """Clear the timings and start timing the first stage"""
+    global _last
+    with _lock:
+        _timings.clear()
+    _last = time.perf_counter()
+
+
+def lap(stage: str) -> None:
+    global _last
+    now = time.perf_counter()
+    if _last is not None:
+        add(stage, now - _last)
+    _last = now
+
+
+def add(stage: str, seconds: float) -> None:
+    with _lock:
+        _timings[stage] = _timings.get(stage, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Add the time spent in the block to stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(stage, time.perf_counter() - started)
+
+
+def timed_iter(stage: str, items: Iterable[T]) -> Iterator[T]:
+    """Yield from items, adding the time spent producing each one to stage"""
+    items = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        finally:
+            add(stage, time.perf_counter() - started)
+        yield item
+
+
+def timings() -> Dict[str, float]:
+    with _lock:
+        return dict(_timings)
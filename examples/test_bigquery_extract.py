@@ -0,0 +1,148 @@
+import os
+
+import pandas as pd
+import pantab
+import pyarrow.parquet as pq
+import pytest
+
+import bigquery_extract
+from bigquery_extract import Autotuner, BigQueryConfig, BigQueryExtractor
+from fake_bigquery import FakeBigQuerySource, SCHEMAS
+
+
+class FailingSource(FakeBigQuerySource):
+    """Fails every fetch of the slice starting at id 0"""
+
+    def fetch(self, columns, where):
+        if self._select(where)[0] == 0:
+            raise ConnectionError("fetch failed")
+        return super().fetch(columns, where)
+
+
+class RecordingSource(FakeBigQuerySource):
+    """Records the filters of every fetch and the read sessions it creates"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetches = []
+        self.sessions = 0
+
+    def fetch(self, columns, where):
+        self.fetches.append(where)
+        return super().fetch(columns, where)
+
+    def read_session(self, columns, where, max_streams):
+        self.sessions += 1
+        return super().read_session(columns, where, max_streams)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bigquery_extract.time, 'sleep', lambda seconds: None)
+
+
+def make_config(tmp_path, **overrides):
+    settings = dict(project_id='local', source_project='fake', dataset_id='test', table_id='events',
+                    output_path=str(tmp_path), chunk_size=1_000, max_workers=2)
+    settings.update(overrides)
+    return BigQueryConfig(**settings)
+
+
+@pytest.mark.parametrize('output_format', ['hyper', 'parquet', 'csv'])
+def test_failed_chunk_leaves_no_partial_output(tmp_path, output_format):
+    config = make_config(tmp_path, output_format=output_format)
+    extractor = BigQueryExtractor(config, FailingSource(SCHEMAS['events'], 5_000))
+
+    rows, output = extractor.extract_data()
+
+    assert output is None
+    assert extractor.failed_chunks
+    assert os.listdir(tmp_path) == []
+
+
+def test_table_without_slice_column_is_read_once(tmp_path):
+    source = RecordingSource(SCHEMAS['events'], 5_000, partitioned=False)
+
+    rows, output = BigQueryExtractor(make_config(tmp_path, output_format='parquet'), source).extract_data()
+
+    assert rows == 5_000
+    assert source.sessions == 1
+    assert source.fetches == []
+    assert sorted(pq.read_table(tmp_path / output).column('id').to_pylist()) == list(range(5_000))
+
+
+def test_staging_a_table_without_slice_column_needs_one(tmp_path):
+    config = make_config(tmp_path, stage_chunks=True)
+    extractor = BigQueryExtractor(config, FakeBigQuerySource(SCHEMAS['events'], 5_000, partitioned=False))
+
+    with pytest.raises(ValueError, match='slice_column'):
+        extractor.extract_data()
+
+
+def test_hash_slices_need_a_slice_column(tmp_path):
+    with pytest.raises(ValueError, match='slice_column'):
+        make_config(tmp_path, slice_strategy='hash')
+
+
+def test_oversized_range_slices_are_split_into_ranges(tmp_path):
+    source = RecordingSource(SCHEMAS['events'], 20_000)
+    extractor = BigQueryExtractor(make_config(tmp_path, output_format='parquet', chunk_size=None), source)
+    # Slices of 5,000 rows, of which the autotuner only wants 1,000 at a time
+    extractor.chunk_size = 5_000
+    extractor.autotuner.chunk_rows = lambda: 1_000
+
+    rows, output = extractor.extract_data()
+
+    assert rows == 20_000
+    assert sorted(pq.read_table(tmp_path / output).column('id').to_pylist()) == list(range(20_000))
+    assert len(source.fetches) > 10
+    assert not any('FARM_FINGERPRINT' in where for where in source.fetches)
+
+
+def test_extract_without_failures(tmp_path):
+    config = make_config(tmp_path, output_format='parquet')
+
+    rows, output = BigQueryExtractor(config, FakeBigQuerySource(SCHEMAS['events'], 5_000)).extract_data()
+
+    assert rows == 5_000
+    assert os.path.exists(tmp_path / output)
+
+
+@pytest.mark.parametrize('hyper_write_mode', ['insert', 'merge'])
+def test_hyper_writer_matches_pantab(tmp_path, hyper_write_mode):
+    source = FakeBigQuerySource(SCHEMAS['all_types'], 5_000)
+    tables = {}
+    for mode in ['pantab', hyper_write_mode]:
+        config = make_config(tmp_path / mode, table_id='all_types', stage_chunks=True, hyper_write_mode=mode)
+        os.makedirs(config.output_path)
+        rows, output = BigQueryExtractor(config, source).extract_data()
+        assert rows == 5_000
+        tables[mode] = pantab.frame_from_hyper(tmp_path / mode / output, table='all_types', return_type='pyarrow')
+
+    assert tables[hyper_write_mode].sort_by('id').equals(tables['pantab'].sort_by('id'))
+
+
+def test_upsert_keeps_the_newest_version_of_a_key(tmp_path):
+    config = make_config(tmp_path, watermark_column='updated_at', incremental_mode='upsert', merge_keys=['id'])
+    extractor = BigQueryExtractor(config, FakeBigQuerySource(SCHEMAS['events'], 0))
+    target = tmp_path / 'events.hyper'
+    delta = tmp_path / 'events_delta.hyper'
+    pantab.frame_to_hyper(pd.DataFrame({'id': [1, 2], 'updated_at': [1, 1], 'value': ['a', 'b']}), target, table='events')
+    # Key 1 was updated twice since the last run
+    pantab.frame_to_hyper(pd.DataFrame({'id': [1, 1, 3], 'updated_at': [3, 2, 2], 'value': ['new', 'old', 'c']}),
+                          delta, table='events')
+
+    replaced = extractor._merge_delta(str(delta), str(target))
+
+    rows = pantab.frame_from_hyper(target, table='events').sort_values('id')
+    assert replaced == 1
+    assert rows['id'].tolist() == [1, 2, 3]
+    assert rows['value'].tolist() == ['new', 'b', 'c']
+
+
+def test_autotuner_with_empty_chunks():
+    autotuner = Autotuner(memory_budget=2 ** 30, max_workers=4)
+    autotuner.observe(1_000, 0)
+
+    assert autotuner.worker_limit() == 4
+    assert autotuner.chunk_rows() == Autotuner.MAX_CHUNK_ROWS